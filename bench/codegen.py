@@ -0,0 +1,80 @@
+# compares the table-driven compiled dfa with the matcher generated from it by src.Codegen, on
+# a small lexer and on one with a few hundred keywords (and as many states)
+# run with: python -m bench.codegen
+import random
+from time import perf_counter
+
+from src.Codegen import generate_matcher
+from src.Lexer import Lexer
+
+
+SPEC = [
+    ('LAMBDA', 'lambda'),
+    ('ID', '([a-z]|[A-Z])+'),
+    ('NUM', '[0-9]+'),
+    ('PLUS', '\\+'),
+    ('CONCAT', '\\+\\+'),
+    ('COLON', ':'),
+    ('LPAREN', '\\('),
+    ('RPAREN', '\\)'),
+    ('WS', '(\\ |\t|\n)+'),
+]
+
+PROGRAM = '(lambda x: (++ (x (1 2 3))) (lambda yy: (+ (yy 42 1337))))\n'
+
+random.seed(0)
+KEYWORDS = sorted({''.join(random.choice('abcdefghijklmnop') for _ in range(random.randint(3, 9)))
+                   for _ in range(200)})
+KEYWORD_SPEC = [(f'K{i}', keyword) for i, keyword in enumerate(KEYWORDS)] + \
+               [('ID', '[a-z]+'), ('WS', '\\ +')]
+KEYWORD_TEXT = ' '.join(random.choice(KEYWORDS + ['zz', 'abq']) for _ in range(40000))
+
+
+def best_of(runs: int, f) -> float:
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        f()
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def tokenize(longest_match, data, n: int) -> int:
+    # the scanning loop of the lexer, without building the tokens
+    count = pos = 0
+    while pos < n:
+        _, pos = longest_match(data, pos)
+        count += 1
+    return count
+
+
+def main() -> None:
+    lexer = Lexer(SPEC, minimize=True)
+    table = lexer.matcher
+    generated = generate_matcher(table)
+    keywords = Lexer(KEYWORD_SPEC, minimize=True).matcher
+    keywords_generated = generate_matcher(keywords)
+
+    text = PROGRAM * 20000
+    word = 'abcdefghijklmnopqrstuvwxyz' * 40000
+    cases = [
+        ('lex loop', text, lambda: tokenize(table.longest_match, table.encode(text), len(text)),
+                           lambda: tokenize(generated.longest_match, text, len(text))),
+        ('long identifier', word, lambda: table.longest_match(table.encode(word)),
+                                  lambda: generated.longest_match(word)),
+        ('accept', word, lambda: table.accept(word), lambda: generated.accept(word)),
+        (f'{len(keywords.rows)} states', KEYWORD_TEXT,
+         lambda: tokenize(keywords.longest_match, keywords.encode(KEYWORD_TEXT), len(KEYWORD_TEXT)),
+         lambda: tokenize(keywords_generated.longest_match, KEYWORD_TEXT, len(KEYWORD_TEXT))),
+    ]
+
+    print(f'{"case":<16} {"chars":>9} {"table (s)":>10} {"generated (s)":>14} {"speedup":>8}')
+    for name, chars, run_table, run_generated in cases:
+        t_table = best_of(5, run_table)
+        t_generated = best_of(5, run_generated)
+        print(f'{name:<16} {len(chars):>9} {t_table:>10.4f} {t_generated:>14.4f} '
+              f'{t_table / t_generated:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# compares thompson's construction with the glushkov position automaton on the regexes of the
+# homework tests: nfa size, construction time and the cost of the subset construction after it
+# run with: python -m bench.glushkov
+import ast
+from pathlib import Path
+from time import perf_counter
+
+from src.NFA import NFA
+from src.Regex import parse_regex
+
+TESTS = Path(__file__).parent.parent / 'test'
+
+
+def hw_regexes() -> list[str]:
+    # the regexes of test_hw_2 and the token regexes of the lexer specifications of test_hw_3
+    regexes: dict[str, None] = {}
+    for name in ('test_hw_2.py', 'test_hw_3.py'):
+        for node in ast.walk(ast.parse((TESTS / name).read_text())):
+            if not isinstance(node, ast.Assign) or not isinstance(node.targets[0], ast.Name):
+                continue
+            if node.targets[0].id == 'regex' and isinstance(node.value, ast.Constant):
+                regexes[node.value.value] = None
+            elif node.targets[0].id == 'spec' and isinstance(node.value, ast.List):
+                for item in node.value.elts:
+                    regexes[ast.literal_eval(item)[1]] = None
+    return list(regexes)
+
+
+def best_of(runs: int, f) -> tuple[float, object]:
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        result = f()
+        times.append(perf_counter() - start)
+    return min(times), result
+
+
+def epsilons(nfa: NFA[int]) -> int:
+    return sum(len(targets) for (_, c), targets in nfa.d.items() if c == '')
+
+
+def main() -> None:
+    totals = {'thompson': [0.0, 0.0, 0, 0], 'glushkov': [0.0, 0.0, 0, 0]}
+    print(f'{"regex":<24} {"construction":<9} {"states":>6} {"eps":>5} {"build (us)":>10} '
+          f'{"dfa states":>10} {"subset (us)":>11}')
+    for regex in hw_regexes():
+        tree = parse_regex(regex)
+        for name, build in (('thompson', tree.thompson), ('glushkov', tree.glushkov)):
+            t_build, nfa = best_of(20, build)
+            t_subset, dfa = best_of(20, nfa.subset_construction)
+            total = totals[name]
+            total[0] += t_build
+            total[1] += t_subset
+            total[2] += len(nfa.K)
+            total[3] += len(dfa.K)
+            print(f'{regex[:24]:<24} {name:<9} {len(nfa.K):>6} {epsilons(nfa):>5} '
+                  f'{t_build * 1e6:>10.1f} {len(dfa.K):>10} {t_subset * 1e6:>11.1f}')
+
+    print()
+    for name, (t_build, t_subset, states, dfa_states) in totals.items():
+        print(f'{"total":<24} {name:<9} {states:>6} {"":>5} {t_build * 1e6:>10.1f} '
+              f'{dfa_states:>10} {t_subset * 1e6:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
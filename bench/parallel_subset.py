@@ -0,0 +1,52 @@
+# measures how subset construction scales with the number of worker processes
+# run with: python -m bench.parallel_subset [max workers]
+import os
+import sys
+from time import perf_counter
+
+from src.NFABuilder import NFABuilder
+from src.NFA import NFA
+from src.Regex import alphabet, parse_regex
+
+
+def keywords(n: int) -> list[tuple[str, str]]:
+    # a lexer specification with n keyword rules sharing prefixes, plus identifiers
+    words = [''.join('abcdefgh'[(i >> shift) % 8] for shift in range(0, 15, 3)) for i in range(n)]
+    return [(f'KW{i}', word) for i, word in enumerate(words)] + [('ID', '([a-z]|[0-9])+')]
+
+
+def combined(spec: list[tuple[str, str]]) -> NFA[int]:
+    # the nfa built by GenericLexer.__init__, without the tags: every token is built into one
+    # NFABuilder over the alphabet shared by all of them
+    regexes = [parse_regex(regex) for _, regex in spec]
+    builder = NFABuilder(alphabet=alphabet(regexes))
+    q0 = builder.add_state()
+    finals = []
+    for regex in regexes:
+        initial, final = regex.build(builder)
+        builder.add_edge(q0, '', initial)
+        finals.append(final)
+    return builder.to_nfa(q0, finals)
+
+
+def main() -> None:
+    most = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    counts = [1] + [n for n in (2, 4, 8, 16, 32) if n <= most]
+    cases = [
+        ('4000 keywords', combined(keywords(4000))),
+        ('(a|b)*a(a|b){14}', parse_regex('(a|b)*a' + '(a|b)' * 14).thompson()),
+    ]
+
+    print(f'{"case":<20} {"workers":>7} {"states":>7} {"time (s)":>9} {"speedup":>8}')
+    for name, nfa in cases:
+        base = None
+        for workers in counts:
+            start = perf_counter()
+            dfa = nfa.subset_construction(complete=False, workers=workers)
+            elapsed = perf_counter() - start
+            base = base or elapsed
+            print(f'{name:<20} {workers:>7} {len(dfa.K):>7} {elapsed:>9.3f} {base / elapsed:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# compares counted repetition r{m,n} with the same regex written out by hand: parse time, nfa
+# size and construction time with thompson and glushkov, and dfa size and construction time with
+# the subset construction and with derivatives
+# run with: python -m bench.repetition
+from time import perf_counter
+
+from src.Regex import parse_regex
+
+
+def written_out(r: str, m: int, n: int | None) -> str:
+    # r{m,n} without the counted syntax: m copies of r, then nested optional copies
+    if n is None:
+        return r * m + f'({r})*'
+    return r * m + f'({r}' * (n - m) + ')?' * (n - m)
+
+
+def timed(f) -> tuple[float, object]:
+    start = perf_counter()
+    result = f()
+    return perf_counter() - start, result
+
+
+def main() -> None:
+    cases = [('[0-9]', 1, n) for n in (19, 100, 1000)] + \
+            [('[a-z]', 3, n) for n in (64, 256, 1000)] + \
+            [('(ab|c)', 500, None), ('(x[^x])', 200, 400)]
+
+    print(f'{"regex":<20} {"syntax":<8} {"chars":>6} {"parse (ms)":>10} {"thompson":>8} '
+          f'{"glushkov":>8} {"nfa (ms)":>8} {"dfa":>5} {"subset (ms)":>11} {"brz":>5} {"brz (ms)":>8}')
+    for r, m, n in cases:
+        name = f'{r}{{{m},{"" if n is None else n}}}'
+        for syntax, regex in (('counted', name), ('written', written_out(r, m, n))):
+            t_parse, tree = timed(lambda: parse_regex(regex))
+            t_thompson, thompson = timed(tree.thompson)
+            t_subset, dfa = timed(lambda: thompson.subset_construction(complete=False))
+            t_brz, brz = timed(tree.brzozowski)
+            print(f'{name:<20} {syntax:<8} {len(regex):>6} {t_parse * 1e3:>10.2f} '
+                  f'{len(thompson.K):>8} {len(tree.glushkov().K):>8} {t_thompson * 1e3:>8.1f} '
+                  f'{len(dfa.K):>5} {t_subset * 1e3:>11.1f} {len(brz.K):>5} {t_brz * 1e3:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+
+MAX_CODE_POINT = 0x10FFFF
+
+Ranges = tuple[tuple[int, int], ...]  # sorted, disjoint, inclusive code point intervals
+
+
+class Alphabet(dict[int, int]):
+    # a partition of the code points into intervals that the regexes an automaton is built from
+    # cannot tell apart. Every interval is represented in the automaton by a single symbol, its
+    # first character, so a character class costs one transition per interval instead of one
+    # per character, and classes too large to enumerate (like [^"]) stay a handful of symbols.
+    # The alphabet is also a str.translate table from every code point to the symbol of its
+    # interval: only the interval starts are stored, and characters are looked up with
+    # bisection the first time they are seen, then remembered.
+    starts: list[int]
+
+    def __init__(self, starts: Iterable[int]) -> None:
+        super().__init__()
+        self.starts = sorted({0, *(start for start in starts if start <= MAX_CODE_POINT)})
+
+    @classmethod
+    def split(cls, ranges: Iterable[tuple[int, int]]) -> 'Alphabet':
+        # the coarsest alphabet in which each of ranges is a union of intervals
+        return cls(bound for lo, hi in ranges for bound in (lo, hi + 1))
+
+    def __missing__(self, point: int) -> int:
+        start = self.starts[bisect_right(self.starts, point) - 1]
+        self[point] = start
+        return start
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Alphabet) and self.starts == other.starts
+
+    def __repr__(self) -> str:
+        return f'Alphabet({self.starts})'
+
+    def translate(self, word: str) -> str:
+        # word with every character replaced by the symbol of its interval
+        return word.translate(self)
+
+    def symbols(self, ranges: Ranges) -> Iterator[str]:
+        # the symbols of the intervals that make up ranges, which must be unions of intervals
+        for lo, hi in ranges:
+            i = bisect_left(self.starts, lo)
+            while i < len(self.starts) and self.starts[i] <= hi:
+                yield chr(self.starts[i])
+                i += 1
+
+    def interval(self, symbol: str) -> tuple[int, int]:
+        # the first and last code points of the interval of a symbol
+        i = bisect_right(self.starts, ord(symbol))
+        return ord(symbol), self.starts[i] - 1 if i < len(self.starts) else MAX_CODE_POINT
+
+
+def normalize_ranges(ranges: Iterable[tuple[int, int]]) -> Ranges:
+    # sort ranges and merge the ones that overlap or touch
+    merged: list[tuple[int, int]] = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = merged[-1][0], max(hi, merged[-1][1])
+        else:
+            merged.append((lo, hi))
+    return tuple(merged)
+
+
+def complement_ranges(ranges: Ranges) -> Ranges:
+    # the code points that are not in (normalized) ranges
+    complement = []
+    start = 0
+    for lo, hi in ranges:
+        if lo > start:
+            complement.append((start, lo - 1))
+        start = hi + 1
+    if start <= MAX_CODE_POINT:
+        complement.append((start, MAX_CODE_POINT))
+    return tuple(complement)
+
+
+def in_ranges(point: int, ranges: Ranges) -> bool:
+    i = bisect_right(ranges, point, key=lambda r: r[0]) - 1
+    return i >= 0 and point <= ranges[i][1]
@@ -0,0 +1,142 @@
+from .Alphabet import MAX_CODE_POINT
+from .CompiledDFA import CompiledDFA, DEAD
+# from Alphabet import MAX_CODE_POINT
+# from CompiledDFA import CompiledDFA, DEAD
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+
+# turns a compiled dfa into the source of a python module with a dedicated matcher: every state
+# becomes a function that tests the next character against string constants (or against the
+# bounds of large intervals) and returns the next state, so the scan does no table lookups at
+# all. The functions are looked up in a tuple by state number, so a step costs the same however
+# many states the dfa has. States with a loop on themselves consume the whole run of loop
+# characters in a tight while loop before dispatching on the next character.
+
+HEADER = '''\
+# generated from a compiled dfa with {states} states, do not edit
+
+
+'''
+
+FOOTER = '''\
+STATES = ({states})
+
+
+def longest_match(text, pos=0):
+    n = len(text)
+    i = pos
+    tag, end = -1, pos
+    state = {q0}
+    while state:
+        state, i, tag, end = STATES[state](text, i, n, tag, end)
+    return (tag, end) if tag >= 0 else (-1, i)
+
+
+def accept(text):
+    tag, end = longest_match(text)
+    return tag >= 0 and end == len(text)
+'''
+
+
+@dataclass
+class GeneratedMatcher:
+    source: str
+    longest_match: Callable[[str, int], tuple[int, int]]
+    accept: Callable[[str], bool]
+
+
+# intervals of at most this many characters are tested by membership in a string constant,
+# larger ones by comparing with their bounds
+SMALL_INTERVAL = 256
+
+
+def targets(dfa: CompiledDFA, state: int) -> dict[int, list[tuple[int, int]]]:
+    # group the intervals of the alphabet (first and last code points) by the state they lead
+    # to from state
+    intervals: dict[int, list[tuple[int, int]]] = {}
+    ends = [*dfa.starts[1:], MAX_CODE_POINT + 1]
+    for start, end, k in zip(dfa.starts, ends, dfa.ids):
+        target = dfa.rows[state][k]
+        if target != DEAD:
+            intervals.setdefault(target, []).append((start, end - 1))
+    return intervals
+
+
+def size(intervals: list[tuple[int, int]]) -> int:
+    return sum(hi - lo + 1 for lo, hi in intervals)
+
+
+def test(intervals: list[tuple[int, int]], c: str = 'c') -> str:
+    # a python expression that is true when the character c is in one of intervals. The
+    # constants are written with ascii(), so the generated module is ascii whatever the alphabet
+    chars = ''.join(chr(p) for lo, hi in intervals if hi - lo < SMALL_INTERVAL
+                    for p in range(lo, hi + 1))
+    tests = [f'{chr(lo)!a} <= {c} <= {chr(hi)!a}' for lo, hi in intervals
+             if hi - lo >= SMALL_INTERVAL]
+    if chars:
+        tests.append(f'{c} == {chars!a}' if len(chars) == 1 else f'{c} in {chars!a}')
+    return ' or '.join(tests)
+
+
+def state_function(dfa: CompiledDFA, state: int) -> list[str]:
+    # the function of a state takes the text, the position of the next character, the length of
+    # the text and the last match (tag, end). It returns the next state, which is DEAD when the
+    # scan is over, followed by the updated position and last match
+    lines = [f'def state_{state}(text, i, n, tag, end):']
+    moves = targets(dfa, state)
+    loop = moves.pop(state, None)
+    if loop is not None:
+        lines.append(f'    while i < n and ({test(loop, "text[i]")}):')
+        lines.append('        i += 1')
+    if dfa.tokens[state] >= 0:
+        lines.append(f'    tag, end = {dfa.tokens[state]}, i')
+    if not moves:
+        lines.append(f'    return {DEAD}, i, tag, end')
+        return lines
+
+    lines.append('    if i == n:')
+    lines.append(f'        return {DEAD}, i, tag, end')
+    lines.append('    c = text[i]')
+    # the most common characters are usually in the largest sets, so test those first
+    for target, intervals in sorted(moves.items(), key=lambda m: -size(m[1])):
+        lines.append(f'    if {test(intervals)}:')
+        lines.append(f'        return {target}, i + 1, tag, end')
+    lines.append(f'    return {DEAD}, i, tag, end')
+    return lines
+
+
+def generate_source(dfa: CompiledDFA) -> str:
+    # the generated longest_match and accept behave like the methods of the same name of
+    # CompiledDFA, except that longest_match takes the text itself instead of encoded data
+    source = [HEADER.format(states=len(dfa.rows))]
+    for state in range(1, len(dfa.rows)):
+        source.extend(f'{line}\n' for line in state_function(dfa, state))
+        source.append('\n\n')
+    functions = ['None'] + [f'state_{state}' for state in range(1, len(dfa.rows))]
+    source.append(FOOTER.format(states=', '.join(functions), q0=dfa.q0))
+    return ''.join(source)
+
+
+# the number of generated modules kept by load_source
+CACHED_MODULES = 64
+
+
+@lru_cache(maxsize=CACHED_MODULES)
+def load_source(source: str) -> dict[str, object]:
+    # compile and run generated source once; identical dfas share the resulting functions, as
+    # long as their module is among the most recently used ones
+    namespace: dict[str, object] = {}
+    exec(compile(source, '<generated dfa>', 'exec'), namespace)
+    return namespace
+
+
+def generate_matcher(dfa: CompiledDFA) -> GeneratedMatcher:
+    source = generate_source(dfa)
+    namespace = load_source(source)
+    return GeneratedMatcher(source, namespace['longest_match'], namespace['accept'])  # type: ignore
+
+
+def write_module(dfa: CompiledDFA, path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(generate_source(dfa))
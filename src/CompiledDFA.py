@@ -0,0 +1,234 @@
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from sys import byteorder
+
+DEAD = 0   # state 0 of every compiled dfa is the sink: it is absorbing and never final
+OTHER = 0  # class 0 stands for every character outside the alphabet; it always leads to DEAD
+
+WIDE_ENCODING = 'utf-32-le' if byteorder == 'little' else 'utf-32-be'
+
+# binary format of a compiled dfa, all little-endian int32 after the header:
+#   header:      magic, version, reserved, number of states, number of columns, q0, interval count
+#   classes:     (first code point, class) pairs, one for each interval of the alphabet
+#   transitions: the rows of the table, one after the other
+#   tokens:      one tag per state
+MAGIC = b'LZDF'
+VERSION = 2
+HEADER = Struct('<4sHHiiii')
+
+
+def little_endian(words: Sequence[int]) -> bytes:
+    data = array('i', words)
+    if byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+class ClassTable(dict[int, str]):
+    # a str.translate table from code points to class ids (as one-character strings). The class
+    # of a code point is looked up by bisection in the intervals of the dfa the first time the
+    # code point is seen, and remembered.
+    starts: Sequence[int]
+    ids: Sequence[int]
+
+    def __init__(self, starts: Sequence[int], ids: Sequence[int]) -> None:
+        super().__init__()
+        self.starts = starts
+        self.ids = ids
+
+    def __missing__(self, point: int) -> str:
+        k = chr(self.ids[bisect_right(self.starts, point) - 1])
+        self[point] = k
+        return k
+
+
+@dataclass
+class CompiledDFA:
+    # the alphabet as sorted intervals of code points: the characters from starts[i] up to the
+    # next start belong to the equivalence class (column) ids[i]. starts[0] is 0, and the
+    # characters no regex reads are in the class OTHER
+    starts: Sequence[int]
+    ids: Sequence[int]
+    # rows[state][class] is the next state, one array('i') per state (or one memoryview slice
+    # per state, for dfas loaded from disk)
+    rows: list[Sequence[int]]
+    q0: int
+    tokens: Sequence[int]    # tokens[state] is the tag of a final state, or -1 for non-final states
+    table: ClassTable = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.table = ClassTable(self.starts, self.ids)
+
+    def class_of(self, c: str) -> int:
+        return ord(self.table[ord(c)])
+
+    def encode(self, word: str) -> Sequence[int]:
+        # translate the word to class ids once, at C speed, so that the scanning loops only index
+        # arrays. Up to 256 classes fit in bytes, otherwise the ids are unpacked into an array.
+        text = word.translate(self.table)
+        if len(self.rows[0]) <= 256:
+            return text.encode('latin-1')
+        data = array('i')
+        data.frombytes(text.encode(WIDE_ENCODING, 'surrogatepass'))
+        return data
+
+    def find_other(self, data: Sequence[int]) -> int:
+        # the index of the first character outside the alphabet in encoded data, or -1
+        if isinstance(data, bytes):
+            return data.find(OTHER)
+        return data.index(OTHER) if OTHER in data else -1
+
+    def run(self, state: int, data: Sequence[int]) -> int:
+        # advance state over encoded data, stopping as soon as the sink is reached
+        if self.find_other(data) >= 0:
+            return DEAD
+        rows = self.rows
+        for k in data:
+            state = rows[state][k]
+            if state == DEAD:
+                break
+        return state
+
+    def accept(self, word: str) -> bool:
+        return self.tokens[self.run(self.q0, self.encode(word))] >= 0
+
+    def stream(self) -> 'StreamMatcher':
+        return StreamMatcher(self)
+
+    def accept_chunks(self, chunks: Iterable[str]) -> bool:
+        # accept the concatenation of the chunks, without joining them and without reading
+        # further once the input can no longer be accepted
+        matcher = self.stream()
+        for chunk in chunks:
+            if not matcher.feed(chunk):
+                return False
+        return matcher.finish()
+
+    def longest_match(self, data: Sequence[int], pos: int = 0) -> tuple[int, int]:
+        """runs the dfa on the encoded data starting at pos and returns a pair (tag, end) where
+        data[pos:end] is the longest accepted prefix and tag is the tag of the final state it
+        reaches. If no prefix is accepted, tag is -1 and end is the index where the dfa fell into
+        the sink state, or len(data) if it never did."""
+        rows, tokens = self.rows, self.tokens
+        state = self.q0
+        tag, end = tokens[state], pos
+        for i, k in enumerate(memoryview(data)[pos:], pos):
+            state = rows[state][k]
+            if state == DEAD:
+                return (tag, end) if tag >= 0 else (-1, i)
+            if tokens[state] >= 0:
+                tag, end = tokens[state], i + 1
+        return (tag, end) if tag >= 0 else (-1, len(data))
+
+    def trace_backwards(self, data: Sequence[int]) -> array:
+        # run the dfa over data from the end to the beginning; states[i] is the state after
+        # reading data[i:] backwards (states[len(data)] is q0, for the empty input)
+        rows = self.rows
+        states = array('i', bytes(4 * (len(data) + 1)))
+        state = states[len(data)] = self.q0
+        for i in range(len(data) - 1, -1, -1):
+            state = states[i] = rows[state][data[i]]
+        return states
+
+    def accept_many(self, words: Iterable[str]):
+        # accept every word in lockstep using numpy (imported here, since it is only needed for
+        # batches). The words are encoded into one flat array of class ids and sorted from the
+        # longest to the shortest; step j then advances at once the words that are longer than j,
+        # which are a prefix of that order, on their j-th character. The work is proportional to
+        # the total length of the words, so a few long ones do not slow down the short ones.
+        # Returns a boolean array in the order of the input.
+        import numpy as np
+
+        words = list(words)
+        lengths = np.fromiter(map(len, words), dtype=np.intp, count=len(words))
+        offsets = np.cumsum(lengths) - lengths
+        order = np.argsort(-lengths, kind='stable')
+        # running[j] is the number of words longer than j
+        running = np.searchsorted(-lengths[order], -np.arange(int(lengths.max(initial=0))), 'left')
+        offsets = offsets[order]
+
+        # map code points to class ids by bisection in the intervals, for all of them at once
+        starts = np.frombuffer(little_endian(self.starts), dtype='<i4')
+        classes = np.frombuffer(little_endian(self.ids), dtype='<i4').astype(np.intc)
+        points = np.frombuffer(''.join(words).encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        ids = classes[np.searchsorted(starts, points, 'right') - 1]
+
+        # states are kept premultiplied by the row width, so one step is a single flat gather
+        columns = len(self.rows[0])
+        table = np.frombuffer(b''.join(row.tobytes() for row in self.rows), dtype=np.intc) * columns
+
+        states = np.full(len(words), self.q0 * columns, dtype=np.intc)
+        for j, alive in enumerate(running):
+            states[:alive] = table[states[:alive] + ids[offsets[:alive] + j]]
+
+        tokens = np.frombuffer(self.tokens.tobytes(), dtype=np.intc)
+        accepted = np.empty(len(words), dtype=np.bool_)
+        accepted[order] = tokens[states // columns] >= 0
+        return accepted
+
+    def save(self, path: str) -> None:
+        pairs = [x for start, k in zip(self.starts, self.ids) for x in (start, k)]
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(self.rows), len(self.rows[0]), self.q0,
+                                len(self.starts)))
+            f.write(little_endian(pairs))
+            for row in self.rows:
+                f.write(little_endian(row))
+            f.write(little_endian(self.tokens))
+
+    @classmethod
+    def load(cls, path: str) -> 'CompiledDFA':
+        # map the file into memory and use the transition table and the tokens in place, so
+        # processes loading the same file share its pages instead of building their own copy.
+        # Only the intervals of the alphabet are copied.
+        with open(path, 'rb') as f:
+            buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+        if len(buffer) < HEADER.size or buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} does not contain a compiled dfa')
+        _, version, _, states, columns, q0, count = HEADER.unpack_from(buffer)
+        if version != VERSION:
+            raise ValueError(f'{path} has version {version}, expected {VERSION}')
+
+        words = memoryview(buffer)[HEADER.size:]
+        if len(words) != 4 * (2 * count + states * columns + states):
+            raise ValueError(f'{path} is truncated or corrupt')
+        words = words.cast('i')
+        if byteorder == 'big':
+            swapped = array('i', words)
+            swapped.byteswap()
+            words = memoryview(swapped)
+
+        starts, ids = array('i', words[0:2 * count:2]), array('i', words[1:2 * count:2])
+        table = words[2 * count:2 * count + states * columns]
+        rows = [table[i:i + columns] for i in range(0, states * columns, columns)]
+        return cls(starts, ids, rows, q0, words[2 * count + states * columns:])
+
+
+class StreamMatcher:
+    # runs a compiled dfa over input that arrives in chunks, carrying the current state from one
+    # chunk to the next. Only the chunk being fed is ever encoded, so memory does not depend on
+    # the length of the input.
+    dfa: CompiledDFA
+    state: int
+
+    def __init__(self, dfa: CompiledDFA) -> None:
+        self.dfa = dfa
+        self.state = dfa.q0
+
+    def feed(self, chunk: str) -> bool:
+        # returns False once the dfa is in the sink: the input is then rejected whatever follows,
+        # so the caller can stop reading
+        if self.state != DEAD:
+            self.state = self.dfa.run(self.state, self.dfa.encode(chunk))
+        return self.state != DEAD
+
+    def finish(self) -> bool:
+        # whether the input fed so far is accepted
+        return self.dfa.tokens[self.state] >= 0
+
+    def reset(self) -> None:
+        self.state = self.dfa.q0
@@ -1,4 +1,9 @@
-from collections.abc import Callable
+from .Alphabet import Alphabet, MAX_CODE_POINT
+from .CompiledDFA import CompiledDFA, StreamMatcher, DEAD, OTHER
+# from Alphabet import Alphabet, MAX_CODE_POINT
+# from CompiledDFA import CompiledDFA, StreamMatcher, DEAD, OTHER
+from array import array
+from collections.abc import Callable, Hashable, Iterable, Iterator
 from dataclasses import dataclass
 
 
@@ -9,9 +14,12 @@ class DFA[STATE]:
     q0: STATE
     d: dict[tuple[STATE, str], STATE]
     F: set[STATE]
+    alphabet: Alphabet | None = None  # the intervals the symbols stand for, see NFA.alphabet
 
     def accept(self, word: str) -> bool:
         # simulate the dfa on the given word. return true if the dfa accepts the word, false otherwise
+        if self.alphabet is not None:
+            word = self.alphabet.translate(word)
         state = self.q0
         for c in word:
             state = self.d.get((state, c))
@@ -19,6 +27,84 @@ class DFA[STATE]:
                 return False
         return state in self.F
 
+    def accept_many(self, words: Iterable[str]):
+        # accept a large batch of words at once, returning a numpy array of booleans.
+        # see CompiledDFA.accept_many
+        return self.compile().accept_many(words)
+
+    def stream(self) -> StreamMatcher:
+        # a matcher for input that arrives in chunks. see CompiledDFA.stream
+        return self.compile().stream()
+
+    def find_all(self, text: str) -> Iterator[tuple[int, int]]:
+        # yield the (start, end) offsets of the leftmost-longest, non-overlapping matches of the
+        # dfa in text, like a grep, in time linear in the length of text. A backward pass with
+        # the dfa from reverse_search records, at every offset i, the set of states from which
+        # some prefix of text[i:] leads to a final state; i is a match start when q0 is in that
+        # set. A forward pass then takes the leftmost start that is not covered by the previous
+        # match and extends it, until its state leaves the set of the offset it has reached:
+        # no later end is possible from there. Every scan thus stops one character after the
+        # end of its match, and the matches do not overlap, so the text is read once in each
+        # direction whatever the regex. Empty matches are reported too, after which the search
+        # moves on by one character.
+        forward = self.compile()
+        reverse = self.reverse_search()
+        backward = reverse.compile()
+        if backward.q0 == DEAD:
+            return
+        # characters outside the alphabet cannot be part of a match, so the backward scan
+        # starts over after them instead of getting stuck in the sink
+        for row in backward.rows[1:]:
+            row[OTHER] = backward.q0
+        trace = backward.trace_backwards(backward.encode(text))
+        is_start = [tag >= 0 for tag in backward.tokens]
+        starts = bytearray(map(is_start.__getitem__, trace))
+        # live[b] is the set of the backward state b, as numbers of compiled forward states
+        numbers = self.numbering()
+        live = [frozenset()] + [frozenset(numbers[q] for q in group if q in numbers)
+                                for group in reverse.numbering()]
+
+        data = forward.encode(text)
+        rows, tokens = forward.rows, forward.tokens
+        pos = starts.find(1)
+        while pos >= 0:
+            state, i, end = forward.q0, pos, pos
+            while True:
+                if tokens[state] >= 0:
+                    end = i
+                if i == len(data):
+                    break
+                state = rows[state][data[i]]
+                i += 1
+                if state not in live[trace[i]]:
+                    break
+            yield pos, end
+            pos = starts.find(1, end if end > pos else pos + 1)
+
+    def reverse_search(self) -> 'DFA[frozenset[STATE]]':
+        # the dfa that reads a text backwards and is in a final state exactly at the offsets
+        # where a match of this dfa starts. After reading text[i:] backwards, its state is the
+        # set of states from which some prefix of text[i:] leads to a final state; offset i is a
+        # match start when q0 is in that set.
+        predecessors: dict[tuple[STATE, str], list[STATE]] = {}
+        for (q, c), v in self.d.items():
+            predecessors.setdefault((v, c), []).append(q)
+
+        start = frozenset(self.F)
+        d: dict[tuple[frozenset[STATE], str], frozenset[STATE]] = {}
+        order = [start]
+        seen = {start}
+        for group in order:
+            for c in self.S:
+                target = start.union(*(predecessors.get((v, c), ()) for v in group))
+                d[(group, c)] = target
+                if target not in seen:
+                    seen.add(target)
+                    order.append(target)
+
+        return DFA(self.S, seen, start, d, {group for group in seen if self.q0 in group},
+                   self.alphabet)
+
     def remap_states[OTHER_STATE](self, f: Callable[[STATE], 'OTHER_STATE']) -> 'DFA[OTHER_STATE]':
         # optional, but might be useful for subset construction and the lexer to avoid state name conflicts.
         # this method generates a new dfa, with renamed state labels, while keeping the overall structure of the
@@ -40,4 +126,163 @@ class DFA[STATE]:
         map_set = lambda s: {f(q) for q in s}
         return DFA(self.S, map_set(self.K), self.q0, 
                    {(f(q), c): f(v) for (q, c), v in self.d.items()}, 
-                   map_set(self.F))
\ No newline at end of file
+                   map_set(self.F), self.alphabet)
+
+    def partition(self, key: Callable[[STATE], Hashable] | None = None) -> dict[STATE, int]:
+        # group the reachable states into classes of equivalent states using Hopcroft's partition
+        # refinement, in O(n * |S| * log n). Missing transitions are treated as going to an
+        # implicit sink. key optionally labels the final states: final states with different
+        # labels are never merged (the lexer uses this to keep tokens apart).
+        # the result maps every reachable state to its class, numbered in bfs order from q0.
+        symbols = sorted(self.S)
+        order = [self.q0]
+        reachable = {self.q0}
+        for q in order:
+            for c in symbols:
+                v = self.d.get((q, c))
+                if v is not None and v not in reachable:
+                    reachable.add(v)
+                    order.append(v)
+
+        sink = object()
+        inverse: dict[str, dict[STATE | object, list[STATE | object]]] = {c: {} for c in symbols}
+        states: list[STATE | object] = list(order)
+        for q in order:
+            for c in symbols:
+                v = self.d.get((q, c), sink)
+                if v is sink and states[-1] is not sink:
+                    states.append(sink)
+                inverse[c].setdefault(v, []).append(q)
+        if states[-1] is sink:
+            for c in symbols:
+                inverse[c].setdefault(sink, []).append(sink)
+
+        initial: dict[Hashable, set[STATE | object]] = {}
+        for q in states:
+            label = (True, key(q) if key else None) if q in self.F else (False, None)
+            initial.setdefault(label, set()).add(q)
+        blocks = list(initial.values())
+        block_of = {q: b for b, block in enumerate(blocks) for q in block}
+
+        # every block but the largest one is a splitter to begin with
+        largest = max(range(len(blocks)), key=lambda b: len(blocks[b]))
+        waiting = set(range(len(blocks))) - {largest}
+        while waiting:
+            splitter = list(blocks[waiting.pop()])
+            for c in symbols:
+                predecessors = inverse[c]
+                touched: dict[int, list[STATE | object]] = {}
+                for v in splitter:
+                    for q in predecessors.get(v, []):
+                        touched.setdefault(block_of[q], []).append(q)
+
+                for b, members in touched.items():
+                    if len(members) == len(blocks[b]):
+                        continue
+                    moved = set(members)
+                    blocks[b] -= moved
+                    blocks.append(moved)
+                    new = len(blocks) - 1
+                    for q in moved:
+                        block_of[q] = new
+                    # if b still has to be processed, both halves do; otherwise the smaller
+                    # half is enough
+                    if b in waiting or len(moved) <= len(blocks[b]):
+                        waiting.add(new)
+                    else:
+                        waiting.add(b)
+
+        numbers: dict[int, int] = {}
+        for q in order:
+            numbers.setdefault(block_of[q], len(numbers))
+        return {q: numbers[block_of[q]] for q in order}
+
+    def quotient(self, classes: dict[STATE, int]) -> 'DFA[int]':
+        # merge the states that share a class; states without a class are dropped
+        return DFA(self.S, set(classes.values()), classes[self.q0],
+                   {(classes[q], c): classes[v] for (q, c), v in self.d.items() if q in classes},
+                   {classes[q] for q in self.F if q in classes}, self.alphabet)
+
+    def minimize(self, key: Callable[[STATE], Hashable] | None = None) -> 'DFA[int]':
+        # the minimal dfa for the same language (see partition for the meaning of key). States
+        # are numbered from 0, which is the initial state.
+        return self.quotient(self.partition(key))
+
+    def live_states(self) -> set[STATE]:
+        # the states from which some final state can still be reached. Every other state behaves
+        # exactly like a sink, so scanning can stop as soon as it enters one of them.
+        predecessors: dict[STATE, list[STATE]] = {}
+        for (q, _), v in self.d.items():
+            predecessors.setdefault(v, []).append(q)
+        live = set(self.F)
+        stack = list(self.F)
+        while stack:
+            for q in predecessors.get(stack.pop(), []):
+                if q not in live:
+                    live.add(q)
+                    stack.append(q)
+        return live
+
+    def numbering(self) -> dict[STATE, int]:
+        # the numbers of the states in the compiled dfa: the reachable live states, in bfs order
+        # from q0, starting from 1 (0 is reserved for the sink)
+        live = self.live_states()
+        chars = sorted(self.S)
+        index: dict[STATE, int] = {}
+        order: list[STATE] = []
+        if self.q0 in live:
+            index[self.q0] = 1
+            order.append(self.q0)
+        for q in order:
+            for c in chars:
+                v = self.d.get((q, c))
+                if v is not None and v in live and v not in index:
+                    index[v] = len(order) + 1
+                    order.append(v)
+        return index
+
+    def compile(self, tags: dict[STATE, int] | None = None) -> CompiledDFA:
+        # renumber the reachable live states to dense ints (see numbering) and lay the transitions
+        # out as one array('i') row per state. Characters on which every state moves the same way
+        # share an equivalence class, and a row only holds one column per class; characters that
+        # lead every state into the sink join the class of characters outside the alphabet. The
+        # classes are laid out as sorted intervals of code points, the ones of the symbols (see
+        # NFA.alphabet), with adjacent intervals of the same class merged. tags optionally labels
+        # final states (e.g. with token indices); untagged final states get the tag 0.
+        tags = tags or {}
+        chars = sorted(self.S)
+        index = self.numbering()
+        order = list(index)
+
+        # the signature of a character is its column: the next state of every state on it
+        columns: dict[tuple[int, ...], int] = {}
+        starts, ids = [0], [OTHER]
+        end = 0  # the first code point after the intervals laid out so far
+        for c in chars:
+            signature = tuple(index.get(self.d.get((q, c)), DEAD) for q in order)
+            k = columns.setdefault(signature, len(columns) + 1) if any(signature) else OTHER
+            lo, hi = self.alphabet.interval(c) if self.alphabet is not None else (ord(c), ord(c))
+            if lo > end and ids[-1] != OTHER:
+                starts.append(end)
+                ids.append(OTHER)
+            if k != ids[-1]:
+                if lo == starts[-1]:
+                    ids[-1] = k
+                else:
+                    starts.append(lo)
+                    ids.append(k)
+            end = hi + 1
+        if end <= MAX_CODE_POINT and ids[-1] != OTHER:
+            starts.append(end)
+            ids.append(OTHER)
+
+        width = len(columns) + 1
+        rows = [array('i', bytes(4 * width)) for _ in range(len(order) + 1)]
+        for signature, k in columns.items():
+            for state, v in enumerate(signature, 1):
+                rows[state][k] = v
+        tokens = array('i', [-1])
+        tokens.extend(-1 if q not in self.F else tags.get(q, 0) for q in order)
+
+        return CompiledDFA(array('i', starts), array('i', ids), rows, index.get(self.q0, DEAD),
+                           tokens)
@@ -0,0 +1,47 @@
+from .CompiledDFA import CompiledDFA
+from .DFA import DFA
+from .LazyDFA import LazyDFA
+from .NFA import NFA, BitParallelNFA, BudgetExceeded
+# from CompiledDFA import CompiledDFA
+# from DFA import DFA
+# from LazyDFA import LazyDFA
+# from NFA import NFA, BitParallelNFA, BudgetExceeded
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Literal
+
+
+@dataclass
+class Determinization[STATE]:
+    # the outcome of a budgeted determinization. matcher has encode, accept and longest_match
+    # whichever way it was built
+    matcher: CompiledDFA | LazyDFA[STATE] | BitParallelNFA[STATE]
+    dfa: DFA[frozenset[STATE]] | None  # the full dfa, if it was built within the budgets
+    exceeded: str | None               # the budget that ran out ('states' or 'time'), if any
+    states: int                        # the number of dfa states built, possibly partial
+    seconds: float                     # the time spent in subset construction
+
+
+def determinize[STATE](nfa: NFA[STATE], tags: dict[STATE, int] | None = None,
+                       max_states: int | None = None, max_seconds: float | None = None,
+                       fallback: Literal['lazy', 'nfa'] = 'lazy',
+                       workers: int | None = None) -> Determinization[STATE]:
+    # run subset construction within the budgets and compile the result. If a budget runs out,
+    # the construction stops and the nfa is matched without a full dfa instead: with a lazy dfa
+    # whose cache is bounded by max_states, or by direct simulation. tags labels the final
+    # states of the nfa like for LazyDFA; a dfa state gets the lowest tag of its final states.
+    if fallback not in ('lazy', 'nfa'):
+        raise ValueError(f'unknown fallback {fallback!r}')
+    tags = tags or {}
+    start = perf_counter()
+    try:
+        dfa = nfa.subset_construction(complete=False, workers=workers,
+                                      max_states=max_states, max_seconds=max_seconds)
+    except BudgetExceeded as e:
+        matcher = LazyDFA(nfa, tags, cache_size=max_states or 4096) if fallback == 'lazy' \
+                  else BitParallelNFA(nfa, tags)
+        return Determinization(matcher, None, e.budget, e.states, e.seconds)
+
+    seconds = perf_counter() - start
+    group_tags = {group: min(tags.get(q, 0) for q in group if q in nfa.F) for group in dfa.F}
+    return Determinization(dfa.compile(group_tags), dfa, None, len(dfa.K), seconds)
@@ -0,0 +1,138 @@
+from .NFA import NFA, EPSILON
+# from NFA import NFA, EPSILON
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+
+@dataclass(eq=False)
+class LazyState[STATE]:
+    subset: frozenset[STATE]  # an epsilon-closed set of nfa states
+    tag: int                  # the tag of the state if it is final, -1 otherwise
+    next: dict[str, 'LazyState[STATE]'] = field(default_factory=dict)
+    evicted: bool = False
+
+
+class LazyDFA[STATE]:
+    # a dfa that is determinized on the fly, in the style of RE2: a subset state is only built
+    # the first time a scan reaches it, and the transitions out of it are filled in one character
+    # at a time. Built states are kept in a cache of at most cache_size states, evicting the least
+    # recently used one. When a scan keeps building states (fewer than min_chars_per_state
+    # characters per state once the cache is full), the cache is not helping, and the rest of the
+    # scan simulates the nfa directly instead.
+    nfa: NFA[STATE]
+    tags: dict[STATE, int]
+    cache_size: int
+    min_chars_per_state: int
+    cache: OrderedDict[frozenset[STATE], LazyState[STATE]]
+    closures: dict[STATE, frozenset[STATE]]
+    built: int      # number of states built so far
+    evictions: int  # number of states evicted so far
+
+    def __init__(self, nfa: NFA[STATE], tags: dict[STATE, int] | None = None,
+                 cache_size: int = 4096, min_chars_per_state: int = 10) -> None:
+        # tags optionally labels the final states of the nfa; a subset gets the lowest tag of
+        # its final states. Untagged final states get the tag 0.
+        self.nfa = nfa
+        self.tags = {q: (tags or {}).get(q, 0) for q in nfa.F}
+        self.cache_size = max(cache_size, 2)
+        self.min_chars_per_state = min_chars_per_state
+        self.cache = OrderedDict()
+        self.closures = {}
+        self.built = 0
+        self.evictions = 0
+
+    def closure(self, state: STATE) -> frozenset[STATE]:
+        closure = self.closures.get(state)
+        if closure is None:
+            self.closures.update(self.nfa.epsilon_closures([state]))
+            closure = self.closures[state]
+        return closure
+
+    def move(self, subset: frozenset[STATE], c: str) -> frozenset[STATE]:
+        # the epsilon-closed set of states reached from subset on c
+        if c == EPSILON:
+            return frozenset()
+        d = self.nfa.d
+        targets: set[STATE] = set()
+        for q in subset:
+            for v in d.get((q, c), ()):
+                targets |= self.closure(v)
+        return frozenset(targets)
+
+    def tag(self, subset: frozenset[STATE]) -> int:
+        return min((self.tags[q] for q in subset if q in self.tags), default=-1)
+
+    def state(self, subset: frozenset[STATE]) -> LazyState[STATE]:
+        # the cached state for subset, building it (and evicting the lru state) if needed
+        state = self.cache.get(subset)
+        if state is not None:
+            self.cache.move_to_end(subset)
+            return state
+        state = self.cache[subset] = LazyState(subset, self.tag(subset))
+        self.built += 1
+        if len(self.cache) > self.cache_size:
+            _, old = self.cache.popitem(last=False)
+            # transitions into an evicted state are rebuilt the next time they are taken
+            old.evicted = True
+            old.next.clear()
+            self.evictions += 1
+        return state
+
+    def start(self) -> LazyState[STATE]:
+        return self.state(self.closure(self.nfa.q0))
+
+    def encode(self, word: str) -> str:
+        # the lazy dfa reads the symbols of the text (see NFA.alphabet); this mirrors
+        # CompiledDFA.encode so the lexer can scan with either
+        return self.nfa.alphabet.translate(word) if self.nfa.alphabet is not None else word
+
+    def longest_match(self, word: str, pos: int = 0) -> tuple[int, int]:
+        """runs the dfa on word starting at pos and returns a pair (tag, end) with the same
+        meaning as for CompiledDFA.longest_match"""
+        state = self.start()
+        tag, end = state.tag, pos
+        built = self.built
+        for i in range(pos, len(word)):
+            c = word[i]
+            target = state.next.get(c)
+            if target is None or target.evicted:
+                target = state.next[c] = self.state(self.move(state.subset, c))
+                if self.thrashing(i + 1 - pos, self.built - built):
+                    return self.simulate(target.subset, word, i + 1, tag, end)
+            else:
+                self.cache.move_to_end(target.subset)
+            state = target
+            if not state.subset:
+                return (tag, end) if tag >= 0 else (-1, i)
+            if state.tag >= 0:
+                tag, end = state.tag, i + 1
+        return (tag, end) if tag >= 0 else (-1, len(word))
+
+    def thrashing(self, scanned: int, built: int) -> bool:
+        # the scan has gone through the whole cache and still builds a state every few characters
+        return built > self.cache_size and built * self.min_chars_per_state > scanned
+
+    def simulate(self, subset: frozenset[STATE], word: str, pos: int,
+                 tag: int, end: int) -> tuple[int, int]:
+        # the fallback of longest_match once the cache thrashes: continue from subset, reached
+        # after reading word[:pos], computing every subset without caching it
+        i = pos
+        while subset:
+            state_tag = self.tag(subset)
+            if state_tag >= 0:
+                tag, end = state_tag, i
+            if i == len(word):
+                return (tag, end) if tag >= 0 else (-1, len(word))
+            subset = self.move(subset, word[i])
+            i += 1
+        return (tag, end) if tag >= 0 else (-1, i - 1)
+
+    def accept(self, word: str) -> bool:
+        tag, end = self.longest_match(self.encode(word))
+        return tag >= 0 and end == len(word)
+
+    def clear(self) -> None:
+        for state in self.cache.values():
+            state.evicted = True
+            state.next.clear()
+        self.cache.clear()
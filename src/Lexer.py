@@ -1,10 +1,13 @@
+from .NFABuilder import NFABuilder
+from .CompiledDFA import CompiledDFA
 from .DFA import DFA
-from .NFA import NFA
-from .Regex import parse_regex
+from .NFA import BitParallelNFA
+from .Regex import alphabet, parse_regex, derivative_dfa
+# from NFABuilder import NFABuilder
+# from CompiledDFA import CompiledDFA
 # from DFA import DFA
-# from NFA import NFA
-# from Regex import parse_regex
-from functools import reduce
+# from NFA import BitParallelNFA
+# from Regex import alphabet, parse_regex, derivative_dfa
 from typing import Literal, TypeVar, Optional
 from math import inf
 
@@ -16,55 +19,86 @@ error_format = (lambda line, col: f"No viable alternative at character {col}, li
 
 class GenericLexer[Token]:
     tokenNames: list[Token]
-    tokenStates: dict[int, int]  # map final state to token index in the specification
-    dfa: DFA[frozenset[int]]
+    # map final states to their token index in the specification: the final states of the
+    # combined nfa with the thompson and glushkov constructions, the ones of the dfa itself with
+    # the brzozowski construction (which builds no nfa)
+    tokenStates: dict[int, int]
+    dfa: DFA[frozenset[int]] | DFA[int] | None
+    matcher: CompiledDFA | BitParallelNFA  # the dfa above, compiled and tagged with token indices
 
-    def __init__(self, spec: list[tuple[Token, str]]) -> None:
+    def __init__(self, spec: list[tuple[Token, str]], minimize: bool = False,
+                 engine: Literal['dfa', 'nfa'] = 'dfa', workers: int | None = None,
+                 construction: Literal['thompson', 'glushkov', 'brzozowski'] = 'thompson') -> None:
         """initialisation converts the specification to a dfa which will be used in 
-        the lex method; the specification is a list of pairs (TOKEN_NAME:REGEX)"""
+        the lex method; the specification is a list of pairs (TOKEN_NAME:REGEX). If minimize 
+        is set, the dfa is minimized first (keeping final states of different tokens apart).
+        With engine='nfa' no dfa is built at all: the combined nfa is simulated directly 
+        (see BitParallelNFA), trading scanning speed for construction time. workers is passed 
+        on to subset_construction, to determinize large specifications in parallel. 
+        construction chooses how the nfa of every token is built: with thompson's construction 
+        or as a glushkov position automaton, which has fewer states and no epsilon edges. 
+        construction='brzozowski' skips the nfa and builds the dfa from regex derivatives"""
+        if engine not in ('dfa', 'nfa'):
+            raise ValueError(f'unknown engine {engine!r}')
+        if construction not in ('thompson', 'glushkov', 'brzozowski'):
+            raise ValueError(f'unknown construction {construction!r}')
+        if minimize and engine != 'dfa':
+            raise ValueError('only the dfa engine can be minimized')
+        if construction == 'brzozowski' and engine != 'dfa':
+            raise ValueError('the brzozowski construction only builds dfas')
 
         self.tokenStates = dict()
         self.tokenNames = [name for name, _ in spec]
-        def combiner(acc: tuple[NFA[int], int], spec_index: int) -> tuple[NFA[int], int]:
-            _, regex_str = spec[spec_index]
-            nfa_acc, last_state = acc
-            nfa = parse_regex(regex_str).thompson(last_state + 1)
-            self.tokenStates[nfa.q0 + len(nfa.K) - 1] = spec_index
-            transitions = nfa_acc.d | nfa.d
-            transitions[(0, '')] |= {nfa.q0}
-            return NFA(nfa_acc.S | nfa.S, nfa_acc.K | nfa.K, 0,
-                       transitions, nfa_acc.F | nfa.F), last_state + len(nfa.K)
+        regexes = [parse_regex(regex) for _, regex in spec]
+        if construction == 'brzozowski':
+            # the final states of this dfa are tagged directly with their token
+            self.dfa, self.tokenStates = derivative_dfa(regexes)
+            self.finish(self.tokenStates, minimize)
+            return
 
-        initial_acc = (NFA(set(), {0}, 0, {(0, ''): set()}, set()), 0)
-        nfa, _ = reduce(combiner, range(0, len(spec)), initial_acc)
-        
-        self.dfa = nfa.subset_construction()
+        # every token is built into one nfa, whose initial state has an epsilon edge to the
+        # initial state of every token. The tokens share one alphabet, so the classes of
+        # different tokens are split into the same intervals
+        builder = NFABuilder(alphabet=alphabet(regexes))
+        q0 = builder.add_state()
+        for spec_index, regex in enumerate(regexes):
+            if construction == 'glushkov':
+                initial, finals = regex.build_glushkov(builder)
+            else:
+                initial, final = regex.build(builder)
+                finals = {final}
+            builder.add_edge(q0, '', initial)
+            self.tokenStates.update(dict.fromkeys(finals, spec_index))
+        nfa = builder.to_nfa(q0, self.tokenStates)
+        if engine == 'nfa':
+            self.dfa = None
+            self.matcher = BitParallelNFA(nfa, self.tokenStates)
+            return
 
-    def longest_prefix_match(self, word: str) -> tuple[frozenset[int] | None, int]:
-        """returns a pair (last_state, length) where last_state is the final state the dfa
-        reaches when accepting a prefix of the word and length is the length of the 
-        longest such prefix. If no prefix is accepted, last_state is None and length is the 
-        length of the scanned prefix until reaching a sink state (if any) or the end of the word."""
-        state = self.dfa.q0
-        accepted = state in self.dfa.F
-        accept_state = state if accepted else None
-        accept_index = 0 if accepted else -1
+        self.dfa = nfa.subset_construction(complete=False, workers=workers)
+        # a final group matches the token with the lowest index among its final nfa states
+        self.finish({group: int(min(self.tokenStates.get(state, inf) for state in group))
+                     for group in self.dfa.F}, minimize)
 
-        for i, c in enumerate(word):
-            state = self.dfa.d.get((state, c))
-            # state may be None if the word contains a character not in the alphabet
-            if state in self.dfa.F:
-                accepted = True
-                accept_state = state
-                accept_index = i + 1
-            # subset ∘ thompson produces the unique sink state represented by frozenset()
-            if state == frozenset() or state is None:
-                return accept_state if accepted else None, accept_index if accepted else i
-        
-        if state in self.dfa.F:
-            return state, len(word)
+    def finish(self, tags: dict, minimize: bool) -> None:
+        # minimize the dfa if asked to and compile it, with every final state tagged with the
+        # index of its token
+        assert self.dfa is not None
+        if minimize:
+            classes = self.dfa.partition(tags.get)
+            tags = {classes[group]: tag for group, tag in tags.items() if group in classes}
+            self.dfa = self.dfa.quotient(classes)
+        self.matcher = self.dfa.compile(tags)
 
-        return accept_state if accepted else None, accept_index if accepted else len(word)
+    def longest_prefix_match(self, word: str) -> tuple[int | None, int]:
+        """returns a pair (token_index, length) where token_index is the index in the 
+        specification of the token matched by the longest accepted prefix of the word and 
+        length is the length of that prefix. If no prefix is accepted, token_index is None and 
+        length is the length of the scanned prefix until reaching a sink state (if any) or the 
+        end of the word. The first element is a token index, not a dfa state: the compiled dfa 
+        (or the simulated nfa) only knows the tokens of its states."""
+        tag, length = self.matcher.longest_match(self.matcher.encode(word))
+        return tag if tag >= 0 else None, length
 
     def lex(self, word: str) -> list[tuple[Token, str]] | list[tuple[Literal[""], str]]:
         # this method splits the lexer into tokens based on the specification and the rules described in the lecture
@@ -72,30 +106,28 @@ class GenericLexer[Token]:
         tokens: list[tuple[Token, str]] = []
 
         line_lengths = (len(line) for line in word.split('\n'))
-        index: int = 0
 
-        suffix = word
-        while suffix != '':
-            debug_print(f"{suffix=}")
-            accept_state, length = self.longest_prefix_match(suffix)
-            index += length
-            debug_print(f"{accept_state=}, {length=}")
-            if accept_state is None:
-                col = index
+        # the word is encoded once and then scanned in place, instead of slicing off suffixes
+        data = self.matcher.encode(word)
+        index: int = 0
+        while index < len(word):
+            debug_print(f"{index=}")
+            tokenIndex, end = self.matcher.longest_match(data, index)
+            debug_print(f"{tokenIndex=}, {end=}")
+            if tokenIndex < 0:
+                col = end
                 line: int = 0
                 for line, linelen in enumerate(line_lengths):
                     col -= (line > 0)
                     if col < linelen: break
                     col -= linelen
-                if length == len(suffix):
+                if end == len(word):
                     return [("", error_format(line, "EOF"))]
                 else: 
                     return [("", error_format(line, col))]
             
-            prefix = suffix[:length]
-            tokenIndex = int(min(self.tokenStates.get(state, inf) for state in accept_state))
-            tokens.append((self.tokenNames[tokenIndex], prefix))
-            suffix = suffix[length:]
+            tokens.append((self.tokenNames[tokenIndex], word[index:end]))
+            index = end
 
         return tokens
     
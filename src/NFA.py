@@ -1,14 +1,86 @@
+from .Alphabet import Alphabet
 from .DFA import DFA
+# from Alphabet import Alphabet
 # from DFA import DFA
 
-from dataclasses import dataclass
-from collections.abc import Callable
-from queue import Queue
-from functools import reduce
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from collections.abc import Callable, Hashable, Iterable, Iterator
 
 EPSILON = ''  # this is how epsilon is represented by the checker in the transition function of NFAs
 
 
+def bit_indices(mask: int) -> list[int]:
+    # the positions of the set bits of mask, in increasing order. Searching the binary string
+    # skips runs of zeros at C speed, which matters for sparse masks over large nfas.
+    bits = bin(mask)[:1:-1]
+    indices = []
+    i = bits.find('1')
+    while i >= 0:
+        indices.append(i)
+        i = bits.find('1', i + 1)
+    return indices
+
+
+class BudgetExceeded(ValueError):
+    # raised by a subset construction that runs out of budget. budget is the one that ran out
+    # ('states' or 'time'), states the number of dfa states built by then
+    budget: str
+    states: int
+    seconds: float
+
+    def __init__(self, budget: str, states: int, seconds: float):
+        super().__init__(f'subset construction exceeded its {budget} budget '
+                         f'after {states} states and {seconds:.3f}s')
+        self.budget = budget
+        self.states = states
+        self.seconds = seconds
+
+
+# the smallest frontier worth sending to the process pool of a parallel subset construction;
+# smaller ones are expanded in the coordinator
+PARALLEL_MIN_FRONTIER = 64
+
+# the move tables of the nfa being determinized, in the worker processes of the pool
+worker_tables: tuple[dict[str, dict[int, int]], list[list[str]]] = ({}, [])
+
+
+def successors(group: int, moves: dict[str, dict[int, int]],
+               symbols: list[list[str]]) -> dict[str, int]:
+    # the group (a bitmask of nfa states) reached from group on each of the symbols of its
+    # members. moves[c] maps the bit of every state with a transition on c to its move mask,
+    # symbols[i] lists the characters state i has transitions on. Moves to the empty set are
+    # left out.
+    members = bit_indices(group)
+    row = {}
+    for c in set().union(*(symbols[i] for i in members)):
+        move = moves[c]
+        target = 0
+        for i in members:
+            target |= move.get(i, 0)
+        if target:
+            row[c] = target
+    return row
+
+
+def init_worker(moves: dict[str, dict[int, int]], symbols: list[list[str]]) -> None:
+    # the tables are sent once per worker instead of with every shard
+    global worker_tables
+    worker_tables = (moves, symbols)
+
+
+def expand_in_worker(groups: list[int]) -> tuple[list[int], list[dict[str, int]]]:
+    # the rows of a shard share most of their targets, so every distinct target is sent back to
+    # the coordinator once, and the rows refer to targets by their position in that list
+    rows = [successors(group, *worker_tables) for group in groups]
+    index: dict[int, int] = {}
+    for row in rows:
+        for c, target in row.items():
+            row[c] = index.setdefault(target, len(index))
+    return list(index), rows
+
+
 @dataclass
 class NFA[STATE]:
     S: set[str]
@@ -16,53 +88,241 @@ class NFA[STATE]:
     q0: STATE
     d: dict[tuple[STATE, str], set[STATE]]
     F: set[STATE]
+    # the nfas built from regexes read one symbol per interval of code points (see Alphabet):
+    # words are translated through the alphabet before they are run. Without one, the symbols
+    # are the characters themselves
+    alphabet: Alphabet | None = None
+    # the simulator used by accept and match, built by the first call (see simulate)
+    simulator: 'BitParallelNFA[STATE] | None' = field(default=None, init=False, repr=False,
+                                                      compare=False)
 
     def epsilon_closure(self, state: STATE) -> set[STATE]:
         # compute the epsilon closure of a state (you will need this for subset construction)
         # see the EPSILON definition at the top of this file
-        def helper(openSet: set[STATE], closedSet: set[STATE]) -> set[STATE]:
-            if openSet == set():
-                return closedSet
-            else:
-                nextState = next(iter(openSet))
-                return helper(
-                    (openSet | self.d.get((nextState, EPSILON), set())) - closedSet - {nextState},
-                    closedSet | {nextState})
-
-        return helper({state}, set())
-
-    def subset_construction(self) -> DFA[frozenset[STATE]]:
-        # convert this nfa to a dfa using the subset construction algorithm
-        epsilon_closures = {state: self.epsilon_closure(state) for state in self.K}
-        dfaDict = dict()
-        closedStates = set()
-        finalStates = set()
-        dfaInitState = frozenset(epsilon_closures.get(self.q0, set()))
-
-        openStates = Queue(1 << len(self.K))
-        openStates.put(dfaInitState)
-        closedStates.add(dfaInitState)
-
-        characters = self.S - {''}
-        while not openStates.empty():
-            group: frozenset[STATE] = openStates.get(False)
-            if group & self.F != set():
-                finalStates.add(group)
-
-            for c in characters:
-                nextStates = reduce(lambda acc, s: acc | self.d.get((s, c), set()), 
-                                    group, set[STATE]())
-                nextGroup = reduce(lambda acc, s: acc | epsilon_closures.get(s, set()), 
-                                   nextStates, set[STATE]())
-                nextGroup = frozenset(nextGroup)
-
-                if nextGroup not in closedStates:
-                    openStates.put(nextGroup)
-                    closedStates.add(nextGroup)
-
-                dfaDict[(group, c)] = nextGroup
-
-        return DFA(characters, closedStates, dfaInitState, dfaDict, finalStates)
+        return set(self.epsilon_closures([state])[state])
+
+    def epsilon_closures(self, roots: Iterable[STATE] | None = None) -> dict[STATE, frozenset[STATE]]:
+        # compute the epsilon closures of the roots (all states by default) and of every state
+        # reachable from them through epsilon transitions, in a single pass. The epsilon graph is
+        # condensed into strongly connected components with an iterative version of Tarjan's
+        # algorithm, which emits a component only after every component it reaches; the
+        # closure of a component is then its own states plus the closures of its successors,
+        # and all the states of a component share one frozenset.
+        epsilon = lambda q: self.d.get((q, EPSILON), ())
+        index: dict[STATE, int] = {}
+        low: dict[STATE, int] = {}
+        stack: list[STATE] = []
+        on_stack: set[STATE] = set()
+        closures: dict[STATE, frozenset[STATE]] = {}
+
+        def visit(q: STATE) -> None:
+            index[q] = low[q] = len(index)
+            stack.append(q)
+            on_stack.add(q)
+
+        for root in (self.K if roots is None else roots):
+            if root in index:
+                continue
+            visit(root)
+            work = [(root, iter(epsilon(root)))]
+            while work:
+                q, successors = work[-1]
+                for v in successors:
+                    if v not in index:
+                        visit(v)
+                        work.append((v, iter(epsilon(v))))
+                        break
+                    if v in on_stack:
+                        low[q] = min(low[q], index[v])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[q])
+                    if low[q] != index[q]:
+                        continue
+                    component = set()
+                    while True:
+                        v = stack.pop()
+                        on_stack.remove(v)
+                        component.add(v)
+                        if v == q:
+                            break
+                    closure = set(component)
+                    for v in component:
+                        for w in epsilon(v):
+                            if w not in component:
+                                closure |= closures[w]
+                    shared = frozenset(closure)
+                    for v in component:
+                        closures[v] = shared
+        return closures
+
+    def reachable_states(self) -> set[STATE]:
+        # the states reachable from q0 through any transitions
+        successors: dict[STATE, list[STATE]] = {}
+        for (q, _), targets in self.d.items():
+            successors.setdefault(q, []).extend(targets)
+        reachable = {self.q0}
+        stack = [self.q0]
+        while stack:
+            for v in successors.get(stack.pop(), []):
+                if v not in reachable:
+                    reachable.add(v)
+                    stack.append(v)
+        return reachable
+
+    def subset_construction(self, complete: bool = True, workers: int | None = None,
+                            max_states: int | None = None,
+                            max_seconds: float | None = None) -> DFA[frozenset[STATE]]:
+        # convert this nfa to a dfa using the subset construction algorithm. While exploring,
+        # sets of nfa states are integer bitmasks over the reachable states: a successor set is
+        # the bitwise or of precomputed per-state move masks (which already include the epsilon
+        # closures of the targets), and discovered sets get dense ids through a dict. The
+        # frozensets labelling the dfa states are only built once, at the end.
+        # a group only looks at the symbols its members have transitions on, so moves to the
+        # empty set are never computed. With complete=False they are left out of the result
+        # (the dfa methods treat missing transitions as dead); by default the empty set is added
+        # as an explicit sink so that the dfa is complete. With workers > 1, the successors of
+        # large frontiers are computed by a pool of that many processes; the result is the same.
+        # max_states and max_seconds bound the construction: BudgetExceeded is raised as soon as
+        # the dfa would get more states, or the construction has run for longer.
+        start = perf_counter()
+        states = list(self.reachable_states())
+        bit = {q: i for i, q in enumerate(states)}
+        closures = self.epsilon_closures(states)
+        closure_masks: dict[frozenset[STATE], int] = {}
+
+        def closure_mask(q: STATE) -> int:
+            # masks are only built for the closures that are actually needed: q0 and the
+            # targets of non-epsilon transitions
+            closure = closures[q]
+            mask = closure_masks.get(closure)
+            if mask is None:
+                mask = closure_masks[closure] = sum(1 << bit[v] for v in closure)
+            return mask
+
+        # moves[c] maps the bit of every state with a transition on c to its move mask, and
+        # symbols[i] lists the characters state i has transitions on
+        moves: dict[str, dict[int, int]] = {}
+        symbols: list[list[str]] = [[] for _ in states]
+        for (q, c), targets in self.d.items():
+            if c != EPSILON and q in bit:
+                mask = 0
+                for v in targets:
+                    mask |= closure_mask(v)
+                moves.setdefault(c, {})[bit[q]] = mask
+                symbols[bit[q]].append(c)
+        final_mask = sum(1 << bit[q] for q in self.F if q in bit)
+
+        characters = self.S - {EPSILON}
+        initial = closure_mask(self.q0)
+        ids = {initial: 0}
+        masks = [initial]
+        transitions: list[dict[str, int]] = []
+        # the search goes level by level: each frontier is expanded (in shards across the pool,
+        # if there is one and the frontier is large enough) and the coordinator numbers the new
+        # subsets in order, which gives the same numbering as a sequential bfs
+        pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(moves, symbols)) \
+               if workers is not None and workers > 1 else None
+        frontier = [initial]
+        discovered: list[int] = []
+
+        def check_time() -> None:
+            if max_seconds is not None and perf_counter() - start > max_seconds:
+                raise BudgetExceeded('time', len(masks), perf_counter() - start)
+
+        def number(target: int) -> int:
+            n = ids.get(target)
+            if n is None:
+                if max_states is not None and len(masks) >= max_states:
+                    raise BudgetExceeded('states', len(masks), perf_counter() - start)
+                n = ids[target] = len(masks)
+                masks.append(target)
+                discovered.append(target)
+            return n
+
+        try:
+            while frontier:
+                if pool is None or len(frontier) < PARALLEL_MIN_FRONTIER:
+                    for group in frontier:
+                        check_time()
+                        row = successors(group, moves, symbols)
+                        transitions.append({c: number(target) for c, target in row.items()})
+                else:
+                    size = -(-len(frontier) // (4 * workers))
+                    shards = [frontier[i:i + size] for i in range(0, len(frontier), size)]
+                    for targets, rows in pool.map(expand_in_worker, shards):
+                        check_time()
+                        numbers = [number(target) for target in targets]
+                        transitions.extend({c: numbers[k] for c, k in row.items()} for row in rows)
+                frontier = discovered[:]
+                discovered.clear()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        if complete and any(len(row) < len(characters) for row in transitions):
+            # every missing transition goes to the empty set, which loops on itself
+            sink = len(masks)
+            masks.append(0)
+            transitions.append({})
+            transitions = [{c: row.get(c, sink) for c in characters} for row in transitions]
+
+        groups = [frozenset(states[i] for i in bit_indices(mask)) for mask in masks]
+        return DFA(characters, set(groups), groups[0],
+                   {(groups[n], c): groups[v] for n, row in enumerate(transitions)
+                    for c, v in row.items()},
+                   {groups[n] for n, mask in enumerate(masks) if mask & final_mask},
+                   self.alphabet)
+
+    def remove_epsilons(self) -> 'NFA[STATE]':
+        # an equivalent nfa without epsilon transitions. Only q0 and the targets of
+        # non-epsilon transitions are kept: each of them takes over the transitions of its
+        # epsilon closure, and is final if its closure contains a final state. States with
+        # identical futures (same finality and same transitions) are then merged, repeatedly,
+        # since every merge can make more states identical. States keep their names; a merged
+        # group is named after its first state in bfs order from q0.
+        closures = self.epsilon_closures(self.reachable_states())
+        outgoing: dict[STATE, list[tuple[str, set[STATE]]]] = {}
+        for (q, c), targets in self.d.items():
+            if c != EPSILON:
+                outgoing.setdefault(q, []).append((c, targets))
+
+        order = [self.q0]
+        seen = {self.q0}
+        transitions: dict[STATE, dict[str, set[STATE]]] = {}
+        for q in order:
+            row = transitions[q] = {}
+            for p in closures[q]:
+                for c, targets in outgoing.get(p, ()):
+                    row.setdefault(c, set()).update(targets)
+            for targets in row.values():
+                for v in targets:
+                    if v not in seen:
+                        seen.add(v)
+                        order.append(v)
+        finals = {q for q in order if not self.F.isdisjoint(closures[q])}
+
+        signature = lambda q: (q in finals, frozenset((c, frozenset(targets))
+                                                      for c, targets in transitions[q].items()))
+        while True:
+            first: dict[Hashable, STATE] = {}
+            rename = {q: first.setdefault(signature(q), q) for q in order}
+            if len(first) == len(order):
+                break
+            order = [q for q in order if rename[q] == q]
+            finals = {q for q in finals if rename[q] == q}
+            transitions = {q: {c: {rename[v] for v in targets} for c, targets in transitions[q].items()}
+                           for q in order}
+
+        return NFA(self.S - {EPSILON}, set(order), self.q0,
+                   {(q, c): targets for q in order for c, targets in transitions[q].items()}, finals,
+                   self.alphabet)
+
+    def find_all(self, text: str) -> Iterator[tuple[int, int]]:
+        # yield the (start, end) offsets of the leftmost-longest matches in text. see DFA.find_all
+        return self.subset_construction(complete=False).find_all(text)
 
     def remap_states[OTHER_STATE](self, f: 'Callable[[STATE], OTHER_STATE]') -> 'NFA[OTHER_STATE]':
         # optional, but may be useful for the second stage of the project. Works similarly to 'remap_states'
@@ -70,4 +330,154 @@ class NFA[STATE]:
         map_set = lambda s: {f(q) for q in s}
         return NFA(self.S, map_set(self.K), self.q0, 
                    {(f(q), c): map_set(v) for (q, c), v in self.d.items()}, 
-                   map_set(self.F))
+                   map_set(self.F), self.alphabet)
+
+    def simulate(self) -> 'BitParallelNFA[STATE]':
+        # the bit-parallel simulator of this nfa. Its tables are only built once, so the nfa
+        # should not be changed after it has been run
+        if self.simulator is None:
+            self.simulator = BitParallelNFA(self)
+        return self.simulator
+
+    def accept(self, word: str) -> bool:
+        # simulate the nfa directly on word, without building a dfa. see BitParallelNFA
+        return self.simulate().accept(word)
+
+    def match(self, word: str, pos: int = 0) -> int | None:
+        # the end of the longest match of the nfa in word starting at pos, or None if no prefix
+        # of word[pos:] is accepted
+        simulator = self.simulate()
+        tag, end = simulator.longest_match(simulator.encode(word), pos)
+        return end if tag >= 0 else None
+
+
+class FollowTable(dict[int, int]):
+    # the union of the follow masks of the positions of one byte of an active set, for every
+    # value of the byte (see BitParallelNFA). Values are computed the first time they are seen,
+    # so only the combinations that actually occur take memory.
+    follow: list[int]  # the follow masks of the 8 positions of the byte
+
+    def __init__(self, follow: list[int]) -> None:
+        super().__init__()
+        self.follow = follow
+
+    def __missing__(self, byte: int) -> int:
+        mask = 0
+        for b in bit_indices(byte):
+            mask |= self.follow[b]
+        self[byte] = mask
+        return mask
+
+
+class BitParallelNFA[STATE]:
+    # simulates an nfa without determinizing it, in the style of Navarro and Raffinot. The nfa is
+    # first reduced to its positions: its initial state and the targets of its character
+    # transitions, with epsilon transitions folded in (like a glushkov automaton), and the
+    # positions are split until every one is entered on a single set of symbols. The active set
+    # is then a python int with one bit per position, and a step on c is
+    #     active = Follow(active) & entered[c]
+    # where Follow(active), the union of the successors of the active positions, is looked up
+    # one byte of the active set at a time in precomputed tables. A step thus does at most
+    # ceil(m / 8) table lookups for m positions, each or-ing an m-bit mask, whatever the number
+    # of active positions; no subset is ever built, which suits patterns that blow up under
+    # subset_construction but are only run on a few inputs.
+    # final positions get the lowest bits, ordered by tag, so the tag of a set of positions is
+    # the tag of its lowest final bit.
+    nfa: NFA[STATE]
+    initial: int
+    final_mask: int
+    size: int                   # the number of bytes of an active set
+    tables: list[FollowTable]   # the follow table of every byte of the active set
+    entered: dict[str, int]     # for every symbol, the mask of the positions entered on it
+    sources: dict[str, int]     # for every symbol, the mask of the positions with a successor on it
+    tags: list[int]             # the tag of every final bit
+
+    def __init__(self, nfa: NFA[STATE], tags: dict[STATE, int] | None = None) -> None:
+        # tags optionally labels the final states of the nfa, like for LazyDFA; a set of states
+        # gets the lowest tag of its final states. Untagged final states get the tag 0.
+        self.nfa = nfa
+        tags = tags or {}
+        reachable = nfa.reachable_states()
+        closures = nfa.epsilon_closures(reachable)
+        edges: dict[STATE, list[tuple[str, STATE]]] = {}
+        for (q, c), targets in nfa.d.items():
+            if c != EPSILON and q in reachable:
+                edges.setdefault(q, []).extend((c, v) for v in targets)
+
+        # a position is a state together with the symbols it is entered on (None for the
+        # initial one); the successors of a position only depend on its state
+        successors: dict[STATE, list[tuple[STATE, frozenset[str] | None]]] = {}
+        positions: list[tuple[STATE, frozenset[str] | None]] = [(nfa.q0, None)]
+        seen = set(positions)
+        for q, _ in positions:
+            if q in successors:
+                continue
+            labels: dict[STATE, set[str]] = {}
+            for u in closures[q]:
+                for c, v in edges.get(u, ()):
+                    labels.setdefault(v, set()).add(c)
+            successors[q] = [(v, frozenset(symbols)) for v, symbols in labels.items()]
+            for position in successors[q]:
+                if position not in seen:
+                    seen.add(position)
+                    positions.append(position)
+
+        tag_of = {q: min(tags.get(f, 0) for f in closures[q] & nfa.F)
+                  for q in successors if not nfa.F.isdisjoint(closures[q])}
+        finals = sorted((p for p in positions if p[0] in tag_of), key=lambda p: tag_of[p[0]])
+        order = finals + [p for p in positions if p[0] not in tag_of]
+        bit = {p: i for i, p in enumerate(order)}
+
+        self.initial = 1 << bit[positions[0]]
+        self.final_mask = (1 << len(finals)) - 1
+        self.tags = [tag_of[q] for q, _ in finals]
+        self.entered = {}
+        self.sources = {}
+        follow = []
+        for p in order:
+            mask = 0
+            for position in successors[p[0]]:
+                mask |= 1 << bit[position]
+                for c in position[1] or ():
+                    self.sources[c] = self.sources.get(c, 0) | 1 << bit[p]
+            follow.append(mask)
+            for c in p[1] or ():
+                self.entered[c] = self.entered.get(c, 0) | 1 << bit[p]
+        self.size = (len(order) + 7) // 8
+        self.tables = [FollowTable(follow[i:i + 8]) for i in range(0, len(order), 8)]
+
+    def encode(self, word: str) -> str:
+        # the simulation reads the symbols of the text (see NFA.alphabet); this mirrors
+        # CompiledDFA.encode so the lexer can scan with either
+        return self.nfa.alphabet.translate(word) if self.nfa.alphabet is not None else word
+
+    def tag(self, active: int) -> int:
+        finals = active & self.final_mask
+        return self.tags[(finals & -finals).bit_length() - 1] if finals else -1
+
+    def longest_match(self, word: str, pos: int = 0) -> tuple[int, int]:
+        """runs the nfa on word starting at pos and returns a pair (tag, end) with the same
+        meaning as for CompiledDFA.longest_match"""
+        active = self.initial
+        tag, end = self.tag(active), pos
+        tables, entered, sources, size = self.tables, self.entered, self.sources, self.size
+        for i in range(pos, len(word)):
+            c = word[i]
+            reading = active & sources.get(c, 0)
+            active = 0
+            if reading:
+                # only the bytes between the lowest and the highest active bit are looked at
+                chunks = reading.to_bytes(size, 'little').rstrip(b'\0')
+                for j in range(((reading & -reading).bit_length() - 1) >> 3, len(chunks)):
+                    if chunks[j]:
+                        active |= tables[j][chunks[j]]
+                active &= entered[c]
+            if not active:
+                return (tag, end) if tag >= 0 else (-1, i)
+            if active & self.final_mask:
+                tag, end = self.tag(active), i + 1
+        return (tag, end) if tag >= 0 else (-1, len(word))
+
+    def accept(self, word: str) -> bool:
+        tag, end = self.longest_match(self.encode(word))
+        return tag >= 0 and end == len(word)
@@ -0,0 +1,43 @@
+from .Alphabet import Alphabet
+from .NFA import NFA, EPSILON
+# from Alphabet import Alphabet
+# from NFA import NFA, EPSILON
+from collections.abc import Iterable
+
+
+class NFABuilder:
+    # collects the states and edges of an nfa, in any order, straight into the transition dict
+    # of the NFA it builds. States are numbered consecutively from base, in the order they are
+    # added, so nothing is ever copied or renamed while building. alphabet is the one of the
+    # regexes built into it: their character classes add one edge per interval of the alphabet.
+    base: int
+    alphabet: Alphabet | None
+    count: int
+    d: dict[tuple[int, str], set[int]]
+
+    def __init__(self, base: int = 0, alphabet: Alphabet | None = None) -> None:
+        self.base = base
+        self.alphabet = alphabet
+        self.count = 0
+        self.d = {}
+
+    def add_state(self) -> int:
+        self.count += 1
+        return self.base + self.count - 1
+
+    def add_edge(self, q: int, c: str, v: int) -> None:
+        targets = self.d.get((q, c))
+        if targets is None:
+            self.d[q, c] = {v}
+        else:
+            targets.add(v)
+
+    def add_epsilons(self, q: int, targets: Iterable[int]) -> None:
+        for v in targets:
+            self.add_edge(q, EPSILON, v)
+
+    def to_nfa(self, q0: int, finals: Iterable[int]) -> NFA[int]:
+        # the nfa built so far, with q0 as its initial state and finals as its final states.
+        # It takes over the edges, so the builder should not be used afterwards
+        return NFA({c for _, c in self.d}, set(range(self.base, self.base + self.count)), q0,
+                   self.d, set(finals), self.alphabet)
@@ -1,117 +1,861 @@
-from .NFA import NFA
-# from NFA import NFA
-from dataclasses import dataclass
-from string import ascii_uppercase, ascii_lowercase, digits
+from .Alphabet import Alphabet, Ranges, normalize_ranges, complement_ranges, in_ranges
+from .NFABuilder import NFABuilder
+from .CompiledDFA import CompiledDFA
+from .DFA import DFA
+from .NFA import NFA, BitParallelNFA
+# from Alphabet import Alphabet, Ranges, normalize_ranges, complement_ranges, in_ranges
+# from NFABuilder import NFABuilder
+# from CompiledDFA import CompiledDFA
+# from DFA import DFA
+# from NFA import NFA, BitParallelNFA
+from array import array
+from collections import deque
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from itertools import count, islice
+from operator import is_
+from typing import Any, Literal
+from weakref import WeakValueDictionary
 
 class Regex:
+    uid = -1  # the id of this regex in the hash-consing table, once it is interned
+    # set when the regex is interned: whether it matches the empty word, and its derivatives
+    # computed so far
+    is_nullable: bool
+    memo: dict[str, 'Regex']
+
+    def walk[T](self, open: Callable[['Regex'], Any], close: Callable[['Regex', Any, list[T]], T],
+                children: Callable[['Regex'], tuple['Regex', ...]] | None = None) -> T:
+        # walk the regex in post-order with an explicit stack, so its depth is not limited by the
+        # python stack: every node is opened, its children (its subexpressions by default) are
+        # walked from left to right, then it is closed with what open returned for it and the
+        # results of its children. Returns the result of closing this regex
+        stack: list[tuple[Regex, int, Any]] = [(self, -1, None)]
+        results: list[T] = []
+        while stack:
+            node, count, opened = stack.pop()
+            if count < 0:
+                subexpressions = node.subexpressions() if children is None else children(node)
+                stack.append((node, len(subexpressions), open(node)))
+                stack.extend((r, -1, None) for r in reversed(subexpressions))
+            else:
+                split = len(results) - count
+                result = close(node, opened, results[split:])
+                del results[split:]
+                results.append(result)
+        return results[0]
+
+    def build(self, builder: NFABuilder) -> tuple[int, int]:
+        # add the thompson nfa of this regex to builder and return its (initial, final) states.
+        # The states of the nfa are the ones added by this call; the final state is the last one.
+        # Every node opens its fragment (adding the states that come before the ones of its
+        # subexpressions), its subexpressions are built, then it closes its fragment with theirs
+        return self.walk(lambda node: node.open_fragment(builder),
+                         lambda node, q0, parts: node.close_fragment(builder, q0, parts))
+
+    def subexpressions(self) -> tuple['Regex', ...]:
+        # the regexes whose thompson fragments are part of the one of this regex
+        return ()
+
+    def open_fragment(self, builder: NFABuilder) -> int | None:
+        # add the states of the fragment that come before the ones of the subexpressions
+        return None
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        # finish the fragment opened as q0, given the (initial, final) states of the fragments
+        # of the subexpressions, and return its own (initial, final) states
+        raise NotImplementedError('the close_fragment method of the Regex class should never be called')
+
     def thompson(self, q0: int = 0) -> NFA[int]:
-        raise NotImplementedError('the thompson method of the Regex class should never be called')
+        # the thompson nfa of this regex, over the states q0, q0 + 1, ... The whole nfa is
+        # built into a single NFABuilder, so no level of the regex copies the edges of the ones
+        # below it
+        builder = NFABuilder(q0, alphabet([self]))
+        initial, final = self.build(builder)
+        return builder.to_nfa(initial, {final})
+
+    def positions(self, labels: list[Ranges],
+                  follow: list[set[int]]) -> tuple[bool, set[int], set[int]]:
+        # number the character positions of this regex (appending the code points each one reads
+        # to labels) and add to follow the positions that can come right after each of them.
+        # Returns (nullable, first, last): whether the regex matches the empty word, and the
+        # positions that can start and end a match. Like build, this walks the regex without
+        # recursion; the positions are numbered from left to right
+        return self.walk(lambda node: None,
+                         lambda node, _, parts: node.close_positions(labels, follow, parts))
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        # the (nullable, first, last) of this regex (see positions), given the ones of its
+        # subexpressions, whose positions are already numbered
+        raise NotImplementedError('the close_positions method of the Regex class should never be called')
+
+    def build_glushkov(self, builder: NFABuilder) -> tuple[int, set[int]]:
+        # add the position automaton of this regex to builder and return its initial and final
+        # states: an initial state, then one state per position, entered on the characters of
+        # that position. There are no epsilon edges.
+        labels: list[Ranges] = []
+        follow: list[set[int]] = []
+        nullable, first, last = self.positions(labels, follow)
+        assert builder.alphabet is not None
+        reads = [list(builder.alphabet.symbols(ranges)) for ranges in labels]
+        q0 = builder.add_state()
+        states = [builder.add_state() for _ in labels]
+        for p in first:
+            for c in reads[p]:
+                builder.add_edge(q0, c, states[p])
+        for p, successors in enumerate(follow):
+            for r in successors:
+                for c in reads[r]:
+                    builder.add_edge(states[p], c, states[r])
+        return q0, {states[p] for p in last} | ({q0} if nullable else set())
+
+    def glushkov(self, q0: int = 0) -> NFA[int]:
+        # the glushkov (position) nfa of this regex, over the states q0, q0 + 1, ...: one state
+        # per character position plus the initial one, and no epsilon edges
+        builder = NFABuilder(q0, alphabet([self]))
+        initial, finals = self.build_glushkov(builder)
+        return builder.to_nfa(initial, finals)
+
+    def matcher(self, engine: Literal['dfa', 'nfa'] = 'dfa') -> CompiledDFA | BitParallelNFA[int]:
+        # a matcher with encode, accept and longest_match for this regex. The dfa engine pays for
+        # subset construction up front and then scans in O(1) per character; the nfa engine
+        # simulates the thompson nfa directly, which is cheaper for patterns that blow up
+        # under determinization and are only run on a few inputs
+        if engine == 'dfa':
+            return self.thompson().subset_construction(complete=False).compile()
+        if engine == 'nfa':
+            return BitParallelNFA(self.thompson())
+        raise ValueError(f'unknown engine {engine!r}')
+
+    def canonical(self) -> 'Regex':
+        # the hash-consed normal form of this regex: equivalent regexes that only differ by the
+        # simplifications of the smart constructors (union, concat, star) get the same object.
+        # A hand-built regex is normalized bottom-up, down to its canonical subexpressions
+        if self.uid >= 0:
+            return self
+        return self.walk(lambda node: None,
+                         lambda node, _, parts: node if node.uid >= 0 else node.normalize(parts),
+                         lambda node: () if node.uid >= 0 else node.operands())
+
+    def operands(self) -> tuple['Regex', ...]:
+        # the regexes this one is made of, each once
+        return ()
+
+    def normalize(self, parts: list['Regex']) -> 'Regex':
+        # the canonical form of this regex, given the ones of its operands
+        raise NotImplementedError('the normalize method of the Regex class should never be called')
+
+    def nullable(self) -> bool:
+        # whether the regex matches the empty word
+        return self.canonical().is_nullable
+
+    def derivative(self, c: str) -> 'Regex':
+        # the canonical regex matching the words w such that c + w matches this regex. Derivatives
+        # are memoized on the canonical regexes, so each one is only computed once. The ones this
+        # derivative is made of are computed first, in a post-order walk, so that derive only
+        # finds memoized derivatives and the depth of the regex is not limited by the python stack
+        node = self.canonical()
+        result = node.memo.get(c)
+        if result is None:
+            def close(r: Regex, _: None, parts: list[Regex]) -> Regex:
+                derived = r.memo.get(c)
+                if derived is None:
+                    derived = r.memo[c] = r.derive(c)
+                return derived
+
+            result = node.walk(lambda r: None, close,
+                               lambda r: () if c in r.memo else r.derivative_parts())
+        return result
+
+    def derivative_parts(self) -> tuple['Regex', ...]:
+        # the operands whose derivatives derive uses
+        return self.operands()
+
+    def derive(self, c: str) -> 'Regex':
+        # the derivative of a canonical regex, see derivative
+        raise NotImplementedError('the derive method of the Regex class should never be called')
+
+    def brzozowski(self) -> DFA[int]:
+        # the dfa of this regex built from its derivatives, without an nfa. see derivative_dfa
+        dfa, _ = derivative_dfa([self])
+        return dfa
+
+@dataclass
+class EmptyRegex(Regex):
+    # matches no word at all. The parser never produces it, but derivatives do
+    def open_fragment(self, builder: NFABuilder) -> int | None:
+        return builder.add_state()
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        assert q0 is not None
+        return q0, builder.add_state()
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        return False, set(), set()
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return EMPTY
+
+    def derive(self, c: str) -> Regex:
+        return EMPTY
 
 @dataclass
 class EpsilonRegex(Regex):
-    def thompson(self, q0: int = 0) -> NFA[int]:
-        return NFA(set(), {q0}, q0, {}, {q0})
+    def open_fragment(self, builder: NFABuilder) -> int | None:
+        return builder.add_state()
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        assert q0 is not None
+        return q0, q0
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        return True, set(), set()
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return EMPTY_WORD
+
+    def derive(self, c: str) -> Regex:
+        return EMPTY
 
 @dataclass
 class CharacterRegex(Regex):
     c: str
 
-    def thompson(self, q0: int = 0) -> NFA[int]:
-        q1 = q0 + 1
-        return NFA({'', self.c}, {q0, q1}, q0, {(q0, self.c): {q1}}, {q1})
+    @property
+    def ranges(self) -> Ranges:
+        return (ord(self.c), ord(self.c)),
+
+    def open_fragment(self, builder: NFABuilder) -> int | None:
+        return builder.add_state()
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        assert q0 is not None
+        q1 = builder.add_state()
+        builder.add_edge(q0, self.c, q1)
+        return q0, q1
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        labels.append(self.ranges)
+        follow.append(set())
+        return False, {len(labels) - 1}, {len(labels) - 1}
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return character(self.c)
+
+    def derive(self, c: str) -> Regex:
+        return EMPTY_WORD if c == self.c else EMPTY
 
 @dataclass
 class ConcatRegex(Regex):
-    r1: Regex
-    r2: Regex
+    # the concatenation of any number of regexes, so a long literal is one flat node. Its factors
+    # are items[start:]: a canonical concatenation shares its tuple with all its suffixes, which
+    # are canonical concatenations too (see Factors)
+    items: tuple[Regex, ...]
+    start: int = 0
+    # set when the regex is interned: the factors it shares with its suffixes
+    shared: 'Factors' = field(init=False, repr=False, compare=False)
+
+    @property
+    def factors(self) -> tuple[Regex, ...]:
+        return self.items[self.start:] if self.start else self.items
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ConcatRegex) and self.factors == other.factors
+
+    def __repr__(self) -> str:
+        return f'ConcatRegex({self.factors!r})'
+
+    def subexpressions(self) -> tuple[Regex, ...]:
+        return self.factors
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        for (_, qf1), (q2, _) in zip(parts, parts[1:]):
+            builder.add_edge(qf1, '', q2)
+        return parts[0][0], parts[-1][1]
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        nullable, first, last = True, set(), set()
+        for nullable2, first2, last2 in parts:
+            for p in last:
+                follow[p] |= first2
+            first = first | first2 if nullable else first
+            last = last | last2 if nullable2 else last2
+            nullable = nullable and nullable2
+        return nullable, first, last
+
+    def operands(self) -> tuple[Regex, ...]:
+        return self.factors
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return concat_all(parts)
+
+    def derivative_parts(self) -> tuple[Regex, ...]:
+        # the factors up to the first one that is not nullable, read in place
+        parts = []
+        for i in range(self.start, len(self.items)):
+            parts.append(self.items[i])
+            if not self.items[i].is_nullable:
+                break
+        return tuple(parts)
+
+    def suffix(self, i: int) -> Regex:
+        # the canonical concatenation of the factors from the i-th one on, which shares the
+        # factors of this one: it is found or made without copying them
+        start, shared = self.start + i, self.shared
+        if start >= len(self.items) - 1:
+            return self.items[start] if start < len(self.items) else EMPTY_WORD
+        return intern(('concat', FactorsKey(shared, start)), lambda: shared.node(start),
+                      start >= shared.nullable_from)
+
+    def derive(self, c: str) -> Regex:
+        # the derivative of the first factor, followed by the others, and the same for the next
+        # factors as long as the ones before them are nullable. The others are a suffix of this
+        # concatenation, so nothing is copied
+        alternatives = []
+        for i in range(len(self.items) - self.start):
+            r = self.items[self.start + i]
+            d = r.derivative(c)
+            if d is not EMPTY:
+                alternatives.append(concat(d, self.suffix(i + 1)))
+            if not r.is_nullable:
+                break
+        return alternation(alternatives)
 
-    def thompson(self, q0: int = 0) -> NFA[int]:
-        nfa1 = self.r1.thompson(q0)
-        qf1 = q0 + len(nfa1.K) - 1
-        nfa2 = self.r2.thompson(qf1 + 1)
-        return NFA(nfa1.S | nfa2.S, nfa1.K | nfa2.K, q0, 
-                   {**nfa1.d, **nfa2.d, (qf1, ''): {nfa2.q0}},
-                   nfa2.F)
-    
 @dataclass
 class UnionRegex(Regex):
-    r1: Regex
-    r2: Regex
+    # the union of any number of regexes, so a large alternation is one flat node
+    alternatives: tuple[Regex, ...]
 
-    def thompson(self, q0: int = 0) -> NFA[int]:
-        nfa1 = self.r1.thompson(q0 + 1)
-        qf1 = q0 + len(nfa1.K)
-        nfa2 = self.r2.thompson(qf1 + 1)
-        qf2 = qf1 + len(nfa2.K)
-        return NFA(nfa1.S | nfa2.S, nfa1.K | nfa2.K | {q0, qf2 + 1}, q0, 
-                   {**nfa1.d, **nfa2.d, (q0, ''): {nfa1.q0, nfa2.q0}, 
-                    (qf1, ''): {qf2 + 1}, (qf2, ''): {qf2 + 1}},
-                   {qf2 + 1})
+    def subexpressions(self) -> tuple[Regex, ...]:
+        # epsilon is built as a single epsilon edge instead of a fragment of its own
+        return tuple(r for r in self.alternatives if r is not EMPTY_WORD)
+
+    def open_fragment(self, builder: NFABuilder) -> int | None:
+        return builder.add_state()
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        return close_alternatives(builder, q0, parts,
+                                  any(r is EMPTY_WORD for r in self.alternatives))
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        nullable = any(r is EMPTY_WORD for r in self.alternatives)
+        first: set[int] = set()
+        last: set[int] = set()
+        for nullable2, first2, last2 in parts:
+            nullable, first, last = nullable or nullable2, first | first2, last | last2
+        return nullable, first, last
+
+    def operands(self) -> tuple[Regex, ...]:
+        return self.alternatives
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return alternation(parts)
+
+    def derive(self, c: str) -> Regex:
+        return alternation([r.derivative(c) for r in self.alternatives])
+
+def close_alternatives(builder: NFABuilder, q0: int | None, parts: list[tuple[int, int]],
+                       optional: bool) -> tuple[int, int]:
+    # the end of the thompson fragment of a union opened as q0. An optional union can be
+    # skipped with a single epsilon edge, instead of going through an epsilon alternative
+    assert q0 is not None
+    qf = builder.add_state()
+    builder.add_epsilons(q0, [q1 for q1, _ in parts] + ([qf] if optional else []))
+    for _, qf1 in parts:
+        builder.add_edge(qf1, '', qf)
+    return q0, qf
 
 @dataclass   
 class KleeneStarRegex(Regex):
     r: Regex
 
-    def thompson(self, q0: int = 0) -> NFA[int]:
-        nfa = self.r.thompson(q0 + 1)
-        qf = q0 + len(nfa.K)
-        qf_next = nfa.d.get((qf, ''), set()) | {nfa.q0, qf + 1}
-        return NFA(nfa.S, nfa.K | {q0, qf + 1}, q0, 
-                   {**nfa.d, (q0, ''): {nfa.q0, qf + 1}, (qf, ''): qf_next},
-                   {qf + 1})
+    def subexpressions(self) -> tuple[Regex, ...]:
+        return self.r,
+
+    def open_fragment(self, builder: NFABuilder) -> int | None:
+        return builder.add_state()
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        assert q0 is not None
+        (q1, qf1), = parts
+        qf = builder.add_state()
+        builder.add_epsilons(q0, (q1, qf))
+        builder.add_epsilons(qf1, (q1, qf))
+        return q0, qf
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        (_, first, last), = parts
+        for p in last:
+            follow[p] |= first
+        return True, first, last
+
+    def operands(self) -> tuple[Regex, ...]:
+        return self.r,
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return star(parts[0])
+
+    def derive(self, c: str) -> Regex:
+        return concat(self.r.derivative(c), self)
    
-class PlusRegex(ConcatRegex):
+@dataclass
+class PlusRegex(Regex):
     r: Regex
-    def __init__(self, r: Regex):
-        self.r = r
-        ConcatRegex.__init__(self, r, KleeneStarRegex(r))
 
-    def __repr__(self):
-        return f'PlusRegex({self.r})'
+    def subexpressions(self) -> tuple[Regex, ...]:
+        return self.r,
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        # a single copy of r, with a back edge from its final state to its initial state
+        (q1, qf1), = parts
+        qf = builder.add_state()
+        builder.add_epsilons(qf1, (q1, qf))
+        return q1, qf
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        (nullable, first, last), = parts
+        for p in last:
+            follow[p] |= first
+        return nullable, first, last
 
-class QuestionRegex(UnionRegex):
+    def operands(self) -> tuple[Regex, ...]:
+        return self.r,
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return plus(parts[0])
+
+    def derive(self, c: str) -> Regex:
+        return concat(self.r.derivative(c), star(self.r))
+
+@dataclass
+class QuestionRegex(Regex):
     r: Regex
-    def __init__(self, r: Regex):
-        self.r = r
-        UnionRegex.__init__(self, r, EpsilonRegex())
 
-    def __repr__(self):
-        return f'QuestionRegex({self.r})'
+    def subexpressions(self) -> tuple[Regex, ...]:
+        return self.r,
+
+    def open_fragment(self, builder: NFABuilder) -> int | None:
+        return builder.add_state()
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        return close_alternatives(builder, q0, parts, True)
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        (_, first, last), = parts
+        return True, first, last
+
+    def operands(self) -> tuple[Regex, ...]:
+        return self.r,
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return union(parts[0], EMPTY_WORD)
+
+@dataclass
+class RepeatRegex(Regex):
+    # r{m,n}: between m and n copies of r, or at least m without an upper bound (n is None).
+    # The node refers to r once, however large the bounds are; only the automata built from it
+    # have a fragment per copy
+    r: Regex
+    m: int
+    n: int | None
+
+    def copies(self) -> int:
+        return self.m if self.n is None else self.n
+
+    def subexpressions(self) -> tuple[Regex, ...]:
+        return (self.r,) * self.copies()
+
+    def open_fragment(self, builder: NFABuilder) -> int | None:
+        # a state to skip the whole repetition from, when it can be empty
+        return builder.add_state() if self.m == 0 else None
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        # the copies are chained like a concatenation, and the end of every copy from the m-th
+        # one on can leave for the final state. Without an upper bound, the last copy loops back
+        # like r+
+        for (_, qf1), (q2, _) in zip(parts, parts[1:]):
+            builder.add_edge(qf1, '', q2)
+        if self.n is None:
+            builder.add_edge(parts[-1][1], '', parts[-1][0])
+        exits = [qf1 for _, qf1 in parts[max(self.m, 1) - 1:]]
+        if q0 is not None:
+            builder.add_edge(q0, '', parts[0][0])
+            exits.append(q0)
+        qf = builder.add_state()
+        for q in exits:
+            builder.add_edge(q, '', qf)
+        return parts[0][0] if q0 is None else q0, qf
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        # like a concatenation of the copies, except that a match can end after any copy from
+        # the m-th one on
+        nullable, first, last = True, set(), set()
+        exits: set[int] = set()
+        for i, (nullable2, first2, last2) in enumerate(parts):
+            for p in last:
+                follow[p] |= first2
+            first = first | first2 if nullable else first
+            last = last | last2 if nullable2 else last2
+            nullable = nullable and nullable2
+            if i + 1 >= self.m:
+                exits |= last
+        if self.n is None:
+            for p in last2:
+                follow[p] |= first2
+        return nullable or self.m == 0, first, exits
+
+    def operands(self) -> tuple[Regex, ...]:
+        return self.r,
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return repeat(parts[0], self.m, self.n)
+
+    def derive(self, c: str) -> Regex:
+        # one copy of r has started, so the bounds of the rest are one smaller
+        return concat(self.r.derivative(c),
+                      repeat(self.r, max(self.m - 1, 0), None if self.n is None else self.n - 1))
 
 @dataclass
 class CharacterSetRegex(Regex):
-    charset: set[str]
+    # a character class, as sorted and disjoint intervals of code points (see Alphabet)
+    ranges: Ranges
 
-    def thompson(self, q0: int = 0) -> NFA[int]:
-        q1 = q0 + 1
-        return NFA(self.charset, {q0, q1}, q0, {(q0, s): {q1} for s in self.charset}, {q1})
+    def open_fragment(self, builder: NFABuilder) -> int | None:
+        return builder.add_state()
+
+    def close_fragment(self, builder: NFABuilder, q0: int | None,
+                       parts: list[tuple[int, int]]) -> tuple[int, int]:
+        # one edge per interval of the alphabet, instead of one per character
+        assert q0 is not None and builder.alphabet is not None
+        q1 = builder.add_state()
+        for c in builder.alphabet.symbols(self.ranges):
+            builder.add_edge(q0, c, q1)
+        return q0, q1
+
+    def close_positions(self, labels: list[Ranges], follow: list[set[int]],
+                        parts: list[tuple[bool, set[int], set[int]]]) -> tuple[bool, set[int], set[int]]:
+        labels.append(self.ranges)
+        follow.append(set())
+        return False, {len(labels) - 1}, {len(labels) - 1}
+
+    def normalize(self, parts: list[Regex]) -> Regex:
+        return character_class(self.ranges)
+
+    def derive(self, c: str) -> Regex:
+        return EMPTY_WORD if in_ranges(ord(c), self.ranges) else EMPTY
 
 class UpercaseRegex(CharacterSetRegex):
     def __init__(self):
-        CharacterSetRegex.__init__(self, set(ascii_uppercase))
+        CharacterSetRegex.__init__(self, ((ord('A'), ord('Z')),))
 
     def __repr__(self):
         return 'UpercaseRegex()'
 
 class LowercaseRegex(CharacterSetRegex):
     def __init__(self):
-        CharacterSetRegex.__init__(self, set(ascii_lowercase))
+        CharacterSetRegex.__init__(self, ((ord('a'), ord('z')),))
 
     def __repr__(self):
         return 'LowercaseRegex()'
 
 class DigitRegex(CharacterSetRegex):
     def __init__(self):
-        CharacterSetRegex.__init__(self, set(digits))
+        CharacterSetRegex.__init__(self, ((ord('0'), ord('9')),))
 
     def __repr__(self):
         return 'DigitRegex()'
 
+# hash-consing: every canonical regex is created once, by the smart constructors below, and is
+# stored under a key made of the uids of its children (or of its factors themselves, for a
+# concatenation: see Factors). Structural equality of canonical regexes is therefore identity,
+# and their uids can stand for them in dicts and tuples. The table only holds weak references:
+# a canonical regex lives as long as something else refers to it (a parsed regex, an enclosing
+# regex, a memoized derivative), so the regexes of a lexer and their derivatives are freed with
+# it instead of piling up for the life of the process. Uids are never reused, so the key of a
+# freed regex cannot come up again.
+interned: WeakValueDictionary[tuple, Regex] = WeakValueDictionary()
+uids = count()
+
+def intern(key: tuple, make: Callable[[], Regex], nullable: bool) -> Regex:
+    node = interned.get(key)
+    if node is None:
+        node = make()
+        node.uid = next(uids)
+        node.is_nullable = nullable
+        node.memo = {}
+        interned[key] = node
+    return node
+
+EMPTY = intern(('empty',), EmptyRegex, False)
+EMPTY_WORD = intern(('epsilon',), EpsilonRegex, True)
+
+def character(c: str) -> Regex:
+    return intern(('char', c), lambda: CharacterRegex(c), False)
+
+def character_class(ranges: Iterable[tuple[int, int]]) -> Regex:
+    key = normalize_ranges(ranges)
+    if not key:
+        return EMPTY
+    if len(key) == 1 and key[0][0] == key[0][1]:
+        return character(chr(key[0][0]))
+    return intern(('class', key), lambda: CharacterSetRegex(key), False)
+
+class Factors:
+    # the factors of canonical concatenations, shared by a concatenation and all its suffixes:
+    # the suffix from start is made of items[start:], it matches the empty word if start is at
+    # least nullable_from, and its key in the hash-consing table has the hash hashes[start]. The
+    # hashes of the suffixes are computed once, from the last factor to the first, so a suffix
+    # is found in the table or added to it in constant time
+    items: tuple[Regex, ...]
+    hashes: array
+    nullable_from: int
+
+    def __init__(self, factors: list[Regex], tail: ConcatRegex | None) -> None:
+        # the factors followed by the ones of tail, whose hashes are reused
+        if tail is None:
+            items, hashes, nullable_from = (), array('q', [hash(())]), 0
+        else:
+            shared = tail.shared
+            items, hashes = tail.factors, shared.hashes[tail.start:]
+            nullable_from = max(shared.nullable_from - tail.start, 0)
+        self.items = (*factors, *items)
+        self.hashes = array('q', bytes(8 * len(factors))) + hashes
+        h = hashes[0]
+        for i in range(len(factors) - 1, -1, -1):
+            h = self.hashes[i] = hash((factors[i].uid, h))
+        self.nullable_from = len(factors) + nullable_from
+        if nullable_from == 0:
+            while self.nullable_from > 0 and factors[self.nullable_from - 1].is_nullable:
+                self.nullable_from -= 1
+
+    def node(self, start: int) -> ConcatRegex:
+        node = ConcatRegex(self.items, start)
+        node.shared = self
+        return node
+
+class FactorsKey:
+    # the key of the canonical concatenation of shared.items[start:]. Two keys are equal if
+    # their factors are the same regexes, which is only checked when their hashes are equal
+    # and they do not share their factors
+    shared: Factors
+    start: int
+
+    def __init__(self, shared: Factors, start: int) -> None:
+        self.shared = shared
+        self.start = start
+
+    def __hash__(self) -> int:
+        return self.shared.hashes[self.start]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FactorsKey) or hash(self) != hash(other):
+            return False
+        if self.shared is other.shared:
+            return self.start == other.start
+        items, other_items = self.shared.items, other.shared.items
+        return (len(items) - self.start == len(other_items) - other.start
+                and all(map(is_, islice(items, self.start, None),
+                            islice(other_items, other.start, None))))
+
+def concat(r1: Regex, r2: Regex) -> Regex:
+    return concat_all([r1, r2])
+
+def concat_all(regexes: list[Regex]) -> Regex:
+    # the canonical concatenation of canonical regexes: the empty language absorbs, epsilon is
+    # dropped, nested concatenations are flattened into a single node, and r r* becomes r+.
+    # A concatenation that comes last is not flattened again: the other factors are put in front
+    # of the factors it shares (see Factors), so the derivatives of a long concatenation cost
+    # the same at every step (see ConcatRegex.derive)
+    if not regexes:
+        return EMPTY_WORD
+    if any(r is EMPTY for r in regexes):
+        return EMPTY
+    tail = regexes[-1] if isinstance(regexes[-1], ConcatRegex) else None
+    factors: list[Regex] = []
+    for r in regexes if tail is None else regexes[:-1]:
+        if isinstance(r, KleeneStarRegex):
+            inner = r.r.factors if isinstance(r.r, ConcatRegex) else (r.r,)
+            if len(factors) >= len(inner) and all(
+                    f is g for f, g in zip(factors[len(factors) - len(inner):], inner)):
+                del factors[len(factors) - len(inner):]
+                factors.append(plus(r.r))
+                continue
+        if isinstance(r, ConcatRegex):
+            factors += r.factors
+        elif r is not EMPTY_WORD:
+            factors.append(r)
+    if tail is None:
+        if len(factors) < 2:
+            return factors[0] if factors else EMPTY_WORD
+    elif not factors:
+        return tail
+    shared = Factors(factors, tail)
+    return intern(('concat', FactorsKey(shared, 0)), lambda: shared.node(0),
+                  shared.nullable_from == 0)
+
+def union(r1: Regex, r2: Regex) -> Regex:
+    return alternation([r1, r2])
+
+def alternation(regexes: list[Regex]) -> Regex:
+    # the canonical union of canonical regexes, up to associativity, commutativity and
+    # idempotence: the alternatives of all of them are flattened into a single node,
+    # deduplicated, stripped of the empty language and sorted by uid. Alternatives that read a
+    # single character are merged into one character set.
+    alternatives: dict[int, Regex] = {}
+    for r in regexes:
+        if isinstance(r, UnionRegex):
+            alternatives.update((r2.uid, r2) for r2 in r.alternatives)
+        else:
+            alternatives[r.uid] = r
+    alternatives.pop(EMPTY.uid, None)
+    singles = [r for r in alternatives.values() if isinstance(r, (CharacterRegex, CharacterSetRegex))]
+    if len(singles) > 1:
+        for r in singles:
+            del alternatives[r.uid]
+        merged = character_class(r for single in singles for r in single.ranges)
+        alternatives[merged.uid] = merged
+    if not alternatives:
+        return EMPTY
+    if len(alternatives) == 1:
+        return next(iter(alternatives.values()))
+    ordered = tuple(alternatives[uid] for uid in sorted(alternatives))
+    return intern(('union', *sorted(alternatives)), lambda: UnionRegex(ordered),
+                  any(r.is_nullable for r in ordered))
+
+def star(r: Regex) -> Regex:
+    if r is EMPTY or r is EMPTY_WORD:
+        return EMPTY_WORD
+    if isinstance(r, KleeneStarRegex):
+        return r
+    if isinstance(r, PlusRegex):
+        return star(r.r)
+    if isinstance(r, UnionRegex) and r.alternatives[0] is EMPTY_WORD:
+        # (eps|r)* is r*; canonical unions sort eps first
+        return star(alternation(list(r.alternatives[1:])))
+    return intern(('star', r.uid), lambda: KleeneStarRegex(r), True)
+
+def plus(r: Regex) -> Regex:
+    if r is EMPTY or isinstance(r, (KleeneStarRegex, PlusRegex)):
+        return r
+    if r.is_nullable:
+        # r+ is r* when r matches the empty word
+        return star(r)
+    return intern(('plus', r.uid), lambda: PlusRegex(r), False)
+
+def repeat(r: Regex, m: int, n: int | None) -> Regex:
+    # r{m,n}, with n None for no upper bound. The bounds that the other operators already
+    # express are built with them
+    if r.is_nullable:
+        # r{m,n} is r{0,n} when r matches the empty word
+        m = 0
+    if n == 0 or r is EMPTY_WORD:
+        return EMPTY_WORD
+    if r is EMPTY:
+        return EMPTY if m > 0 else EMPTY_WORD
+    if n is None and m <= 1:
+        return star(r) if m == 0 else plus(r)
+    if isinstance(r, KleeneStarRegex):
+        return r
+    if n == 1:
+        return r if m == 1 else union(r, EMPTY_WORD)
+    return intern(('repeat', r.uid, m, n), lambda: RepeatRegex(r, m, n), m == 0)
+
+def alphabet(regexes: Iterable[Regex]) -> Alphabet:
+    # the coarsest alphabet in which every character and class of regexes is a union of intervals
+    ranges: list[tuple[int, int]] = []
+    seen: set[int] = set()
+    stack = list(regexes)
+    while stack:
+        r = stack.pop()
+        if r.uid >= 0:
+            if r.uid in seen:
+                continue
+            seen.add(r.uid)
+        if isinstance(r, (CharacterRegex, CharacterSetRegex)):
+            ranges += r.ranges
+        else:
+            stack += r.subexpressions()
+    return Alphabet.split(ranges)
+
+def symbols(regex: Regex, alphabet: Alphabet) -> set[str]:
+    # the symbols of alphabet that regex reads
+    found: set[str] = set()
+    seen: set[int] = set()
+    stack = [regex]
+    while stack:
+        r = stack.pop()
+        if r.uid >= 0:
+            if r.uid in seen:
+                continue
+            seen.add(r.uid)
+        if isinstance(r, (CharacterRegex, CharacterSetRegex)):
+            found.update(alphabet.symbols(r.ranges))
+        else:
+            stack += r.subexpressions()
+    return found
+
+def derivative_dfa(regexes: list[Regex]) -> tuple[DFA[int], dict[int, int]]:
+    # brzozowski's construction for several regexes at once (like the tokens of a lexer), with
+    # no nfa at all. A dfa state is the list of the canonical derivatives of the regexes by the
+    # word read so far, without the ones that became the empty language, so equal states are
+    # found by comparing uids. Missing transitions are dead. Returns the dfa and, for every final
+    # state, the index of the first regex that matches there.
+    # states are only compared on the symbols of the alphabet: the characters of an interval
+    # have the same derivatives
+    start = tuple((i, r.canonical()) for i, r in enumerate(regexes))
+    partition = alphabet(r for _, r in start)
+    chars = sorted(set().union(*(symbols(r, partition) for _, r in start)))
+    states = [start]
+    ids = {tuple((i, r.uid) for i, r in start): 0}
+    d: dict[tuple[int, str], int] = {}
+    for n, state in enumerate(states):
+        for c in chars:
+            target = tuple((i, r.derivative(c)) for i, r in state)
+            target = tuple((i, r) for i, r in target if r is not EMPTY)
+            if not target:
+                continue
+            key = tuple((i, r.uid) for i, r in target)
+            m = ids.get(key)
+            if m is None:
+                m = ids[key] = len(states)
+                states.append(target)
+            d[(n, c)] = m
+
+    tags = {}
+    for n, state in enumerate(states):
+        for i, r in state:
+            if r.is_nullable:
+                tags[n] = i
+                break
+    return DFA(set(chars), set(range(len(states))), 0, d, set(tags), partition), tags
+
 class RegexParserError(ValueError):
     def __init__(self, unexpected: str, expected: str, pos: int):
         super().__init__(RegexParserError, self, f'unexpected {unexpected} '
                          f'at position {pos}, expected {expected}')
 
+CLASS_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+
 class RegexParser:
     input: str
     index: int
@@ -120,67 +864,170 @@ class RegexParser:
         self.index = 0
 
     def __consume(self, c: str) -> bool:
-        cond = self.index + len(c) <= len(self.input) and self.input.startswith(c, self.index)
+        cond = self.input.startswith(c, self.index)
         self.index += cond * len(c)
         return cond
     
     def __strip_whitespace(self):
-        while self.__consume(' '):
-            pass
+        while self.index < len(self.input) and self.input[self.index] == ' ':
+            self.index += 1
     
     def __next_char(self):
+        if self.index >= len(self.input):
+            raise RegexParserError('end of input', 'a regex', self.index)
         self.index += 1
         return self.input[self.index - 1]
     
     def __peek(self) -> str:
         return self.input[self.index] if self.index < len(self.input) else ''
 
-    def __union_term(self) -> Regex:
-        concat_factor = self.__concat_factor()
-        self.__strip_whitespace()
-        return concat_factor if self.__peek() in '|)' \
-                             else ConcatRegex(concat_factor, self.__union_term())
-
-    def __concat_factor(self) -> Regex:
-        unit_item = self.__unit_item()
+    def __postfix(self, unit_item: Regex) -> Regex:
+        # at most one postfix operator applies to a unit; a second one is read as a character
         self.__strip_whitespace()
         if self.__consume('*'):
-            return KleeneStarRegex(unit_item)
+            unit_item = star(unit_item)
         elif self.__consume('+'):
-            return PlusRegex(unit_item)
+            unit_item = plus(unit_item)
         elif self.__consume('?'):
-            return QuestionRegex(unit_item)
-        else:
-            return unit_item
+            unit_item = union(unit_item, EMPTY_WORD)
+        elif self.__peek() == '{':
+            bounds = self.__bounds()
+            if bounds is not None:
+                unit_item = repeat(unit_item, *bounds)
+        self.__strip_whitespace()
+        return unit_item
+
+    def __number(self) -> int | None:
+        start = self.index
+        while '0' <= self.__peek() <= '9':
+            self.index += 1
+        return int(self.input[start:self.index]) if self.index > start else None
+
+    def __bounds(self) -> tuple[int, int | None] | None:
+        # the bounds of a repetition {m}, {m,} or {m,n}, at a '{'. Anything else is left as it
+        # was and None is returned: the '{' is then an ordinary character
+        start = self.index
+        self.index += 1
+        m = self.__number()
+        n = m
+        if m is not None and self.__consume(','):
+            n = self.__number()
+        if m is None or not self.__consume('}'):
+            self.index = start
+            return None
+        if n is not None and n < m:
+            raise RegexParserError(f'bounds {{{m},{n}}}', 'increasing bounds', start)
+        return m, n
+
+    def __class_char(self) -> int | None:
+        # a character of a bracket expression, or None at the end of the input. A backslash
+        # escapes the next character (like \\, \] or \-), and \n, \t and \r are the control
+        # characters they stand for
+        escaped = self.__consume('\\')
+        if self.index >= len(self.input):
+            return None
+        c = self.__next_char()
+        return ord(CLASS_ESCAPES.get(c, c) if escaped else c)
+
+    def __character_class(self) -> Regex | None:
+        # a bracket expression like [a-fA-F0-9_] or [^"\n], at a '['. A ']' right after the
+        # opening bracket and a '-' at either end are ordinary characters. If the bracket is
+        # never closed, the input is left as it was and None is returned: the '[' is then an
+        # ordinary character, as in the rest of the dialect
+        start = self.index
+        self.index += 1
+        negated = self.__consume('^')
+        ranges: list[tuple[int, int]] = []
+        while not ranges or not self.__consume(']'):
+            lo = hi = self.__class_char()
+            if self.__peek() == '-' and self.input[self.index + 1:self.index + 2] not in ('', ']'):
+                self.index += 1
+                hi = self.__class_char()
+            if lo is None or hi is None:
+                self.index = start
+                return None
+            if hi < lo:
+                raise RegexParserError(f'range {chr(lo)}-{chr(hi)}', 'an increasing range', start)
+            ranges.append((lo, hi))
+        return character_class(complement_ranges(normalize_ranges(ranges)) if negated else ranges)
 
     def __unit_item(self) -> Regex:
-        self.__strip_whitespace()
-        if self.__consume('('):
-            inner_regex = self.__parse_regex()
-            if not self.__consume(')'):
-                raise RegexParserError(
-                    self.input[self.index] if self.index < len(self.input) else "end of input",
-                    ')', self.index)
-            return inner_regex
-        elif self.__consume("[a-z]"):
-            return LowercaseRegex()
-        elif self.__consume("[A-Z]"):
-            return UpercaseRegex()
-        elif self.__consume("[0-9]"):
-            return DigitRegex()
-        elif self.__consume("eps"):
-            return EpsilonRegex()
-        elif self.__consume('\\') and self.__peek() in " |*+?(e[":
-            return CharacterRegex(self.__next_char())
+        # a unit other than a group. The keywords are only looked up at the character they
+        # start with, instead of being probed for at every position
+        c = self.__peek()
+        if c == '[':
+            charset = self.__character_class()
+            if charset is not None:
+                return charset
+        elif c == 'e' and self.__consume('eps'):
+            return EMPTY_WORD
+        elif c == '\\':
+            self.index += 1
+            if self.__peek() not in " |*+?(e[":
+                self.__consume('\\')  # optional backslash
+        return character(self.__next_char())
+
+    def __alternative(self, terms: list[Regex], factors: 'deque[Regex | list[Regex]]') -> list[Regex]:
+        # add the complete alternative made of factors to the alternatives in terms. A group of
+        # alternatives that is alone in its alternative is spliced into terms instead, the
+        # shorter list into the longer one, so nested unions are not flattened again at every
+        # level. Returns the list that holds the alternatives now
+        if len(factors) == 1 and isinstance(factors[0], list):
+            inner = factors[0]
+            if len(inner) > len(terms):
+                terms, inner = inner, terms
+            terms.extend(inner)
         else:
-            self.__consume('\\')  # optional backslash
-            return CharacterRegex(self.__next_char())
+            terms.append(concat_all([alternation(r) if isinstance(r, list) else r for r in factors]))
+        return terms
 
     def __parse_regex(self) -> Regex:
-        union_term = self.__union_term()
-        self.__strip_whitespace()
-        return UnionRegex(union_term, self.__parse_regex()) if self.__consume('|') \
-                                                            else union_term
+        # a single left to right pass with an explicit stack of the enclosing groups, so the
+        # nesting depth and the length of the regex are not limited by the python stack. Each
+        # group collects its alternatives and the factors of its current alternative, which are
+        # only canonicalized once they are complete. A closed group without a postfix operator
+        # is not canonicalized at all: the factors of a concatenation are spliced into the
+        # enclosing one, and a union is kept as the list of its alternatives until its own
+        # alternative is complete (see __alternative). Otherwise every level of nesting would
+        # flatten and intern all the levels below it again, in quadratic time
+        groups: list[tuple[list[Regex], deque[Regex | list[Regex]]]] = []
+        union_terms: list[Regex] = []
+        factors: deque[Regex | list[Regex]] = deque()
+        while True:
+            self.__strip_whitespace()
+            if self.__consume('('):
+                groups.append((union_terms, factors))
+                union_terms, factors = [], deque()
+                continue
+            factors.append(self.__postfix(self.__unit_item()))
+
+            # close the alternatives and groups that end after this factor
+            while self.__peek() in '|)':
+                if self.__consume('|'):
+                    union_terms = self.__alternative(union_terms, factors)
+                    factors = deque()
+                    break
+                if not groups:
+                    # an unmatched ')' or the end of the input ends the whole regex
+                    return alternation(self.__alternative(union_terms, factors))
+                if not self.__consume(')'):
+                    raise RegexParserError('end of input', ')', self.index)
+                inner = self.__alternative(union_terms, factors) if union_terms else factors
+                union_terms, factors = groups.pop()
+                self.__strip_whitespace()
+                if self.__peek() and self.__peek() in '*+?{':
+                    if isinstance(inner, list):
+                        inner_regex = alternation(inner)
+                    else:
+                        inner_regex = alternation(self.__alternative([], inner))
+                    factors.append(self.__postfix(inner_regex))
+                elif isinstance(inner, list):
+                    factors.append(inner)
+                elif len(factors) <= len(inner):
+                    inner.extendleft(reversed(factors))
+                    factors = inner
+                else:
+                    factors.extend(inner)
 
     def parse(self, regex: str) -> Regex:
         self.input = regex
@@ -188,5 +1035,7 @@ class RegexParser:
         return self.__parse_regex()
 
 def parse_regex(regex: str) -> Regex:
+    # the parsed regex is canonical (see Regex.canonical): identical subexpressions are shared,
+    # and the simplifications of the smart constructors are already applied
     return RegexParser().parse(regex)
     
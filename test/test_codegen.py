@@ -0,0 +1,74 @@
+import importlib.util
+import itertools
+import os
+import tempfile
+import unittest
+
+from src.Codegen import CACHED_MODULES, generate_matcher, load_source, write_module
+from src.Lexer import Lexer
+from src.Regex import parse_regex
+
+
+class CodegenTests(unittest.TestCase):
+    def test_matches_compiled_dfa(self):
+        for regex in ['ab*', 'a*', 'abcd|c', '(a|b)*abb', 'x(yz)+|y', 'eps|ab', '[0-9]+']:
+            compiled = parse_regex(regex).thompson().subset_construction().compile()
+            generated = generate_matcher(compiled)
+            for length in range(5):
+                for word in map(''.join, itertools.product('abcxyz0?', repeat=length)):
+                    self.assertEqual(generated.accept(word), compiled.accept(word), word)
+                    for pos in range(len(word) + 1):
+                        self.assertEqual(generated.longest_match(word, pos),
+                                         compiled.longest_match(compiled.encode(word), pos),
+                                         f'{regex} on "{word}" from {pos}')
+
+    def test_lexer_tags(self):
+        lexer = Lexer([('ID', '([a-z]|[A-Z])+'), ('NUM', '[0-9]+'), ('WS', '\\ +')])
+        generated = generate_matcher(lexer.matcher)
+
+        self.assertEqual(generated.longest_match('abc 12', 0), (0, 3))
+        self.assertEqual(generated.longest_match('abc 12', 3), (2, 4))
+        self.assertEqual(generated.longest_match('abc 12', 4), (1, 6))
+        self.assertEqual(generated.longest_match('?', 0), (-1, 0))
+
+    def test_large_intervals(self):
+        compiled = Lexer([('STRING', '"[^"]*"'), ('ID', '[a-zA-Z]+')]).matcher
+        generated = generate_matcher(compiled)
+
+        self.assertIn("<= c <=", generated.source)
+        for word in ['"naïve ✓"', '"', 'abcZ"', '"\U0010FFFF"x', 'π']:
+            for pos in range(len(word) + 1):
+                self.assertEqual(generated.longest_match(word, pos),
+                                 compiled.longest_match(compiled.encode(word), pos), word)
+
+    def test_cached_and_written(self):
+        compiled = parse_regex('(a|b)*abb').thompson().subset_construction().compile()
+        first, second = generate_matcher(compiled), generate_matcher(compiled)
+        self.assertIs(first.longest_match, second.longest_match)
+        for n in range(CACHED_MODULES + 10):
+            generate_matcher(parse_regex('a' * n + 'b').thompson().subset_construction().compile())
+        self.assertEqual(load_source.cache_info().currsize, CACHED_MODULES)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'abb.py')
+            write_module(compiled, path)
+            spec = importlib.util.spec_from_file_location('abb', path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+
+        self.assertTrue(module.accept('babb'))
+        self.assertFalse(module.accept('abba'))
+
+    def test_ascii_source(self):
+        # the module can be written and read back whatever the locale
+        compiled = Lexer([('GREEK', '[α-ω]+'), ('WORD', '[éè…]+|[^ ]')]).matcher
+        generated = generate_matcher(compiled)
+
+        self.assertTrue(generated.source.isascii())
+        for word in ['αβω', 'é…', 'ψ?', '€']:
+            self.assertEqual(generated.longest_match(word, 0),
+                             compiled.longest_match(compiled.encode(word)), word)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import itertools
+import os
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from src.CompiledDFA import CompiledDFA
+from src.DFA import DFA
+from src.Lexer import Lexer
+from src.Regex import parse_regex
+
+
+REGEXES = [
+    'a',
+    'ab*c',
+    '(a|b)*abb',
+    '11*(00)*101(0|1)(0|1)*',
+    '([a-z]|[A-Z])+',
+    'eps|x(yz)+',
+]
+
+
+def words(alphabet: str, max_length: int):
+    for length in range(max_length + 1):
+        for word in itertools.product(alphabet, repeat=length):
+            yield ''.join(word)
+
+
+class CompiledDFATests(unittest.TestCase):
+    def test_accept_matches_dfa(self):
+        for regex in REGEXES:
+            dfa = parse_regex(regex).thompson().subset_construction()
+            compiled = dfa.compile()
+            for word in words('abc01xyz?', 4):
+                self.assertEqual(compiled.accept(word), dfa.accept(word),
+                                 f'{regex} disagrees on "{word}"')
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_accept_many(self):
+        for regex in REGEXES:
+            dfa = parse_regex(regex).thompson().subset_construction()
+            batch = list(words('abc01xyz?', 3))
+            accepted = dfa.accept_many(batch)
+            self.assertEqual(accepted.dtype, numpy.bool_)
+            self.assertEqual(accepted.tolist(), [dfa.accept(word) for word in batch], regex)
+
+        self.assertEqual(len(dfa.accept_many([])), 0)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_accept_many_uneven_lengths(self):
+        # a few long words among short ones, in any order
+        compiled = parse_regex('(a|b)*abb').thompson().subset_construction().compile()
+        batch = ['abb', 'a' * 500 + 'bb', '', 'b', 'ab' * 300, 'babb', 'ab' * 299 + 'abb', 'x']
+        self.assertEqual(compiled.accept_many(batch).tolist(),
+                         [compiled.accept(word) for word in batch])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_lone_surrogates(self):
+        # str can hold lone surrogates, which are not valid utf-32 but are still characters
+        for regex in ['a', '[^a]+', '[\ud800-\udfff]x']:
+            compiled = parse_regex(regex).thompson().subset_construction().compile()
+            batch = ['\ud800', 'a\udfff', '\udbffx', 'b\ud800c', 'a']
+            self.assertEqual(compiled.accept_many(batch).tolist(),
+                             [compiled.accept(word) for word in batch], regex)
+        self.assertTrue(parse_regex('[^a]+').matcher().accept('b\ud800c'))
+
+    def test_dense_numbering(self):
+        dfa = DFA({'a', 'b'}, {'p', 'q', 'r', 'sink'}, 'p',
+                  {('p', 'a'): 'q', ('p', 'b'): 'sink', ('q', 'a'): 'r', ('q', 'b'): 'sink',
+                   ('r', 'a'): 'r', ('r', 'b'): 'sink', ('sink', 'a'): 'sink',
+                   ('sink', 'b'): 'sink'},
+                  {'r'})
+        compiled = dfa.compile()
+
+        # the unreachable-final sink is folded into the reserved dead state, and 'b', which
+        # leads every state there, into the class of characters outside the alphabet
+        self.assertEqual(len(compiled.rows), 4)
+        self.assertEqual(compiled.q0, 1)
+        self.assertEqual((list(compiled.starts), list(compiled.ids)), ([0, ord('a'), ord('b')], [0, 1, 0]))
+        self.assertEqual(list(compiled.tokens), [-1, -1, -1, 0])
+
+    def test_equivalence_classes(self):
+        dfa = parse_regex('([a-z]|[A-Z])([a-z]|[0-9])*').thompson().subset_construction()
+        compiled = dfa.compile()
+
+        self.assertEqual(len(set(compiled.ids) - {0}), 3)
+        self.assertEqual(len(compiled.rows[0]), 4)
+        self.assertEqual(compiled.class_of('a'), compiled.class_of('z'))
+        self.assertEqual(compiled.class_of('0'), compiled.class_of('9'))
+        self.assertNotEqual(compiled.class_of('a'), compiled.class_of('A'))
+        # one interval per class, plus the ones of the characters outside the alphabet
+        self.assertEqual(len(compiled.starts), 7)
+
+        data = compiled.encode('ab9?Z')
+        self.assertEqual(compiled.find_other(data), 3)
+        self.assertEqual(compiled.find_other(compiled.encode('Ab9')), -1)
+
+    def test_longest_match(self):
+        dfa = parse_regex('ab*').thompson().subset_construction()
+        compiled = dfa.compile({group: 7 for group in dfa.F})
+
+        self.assertEqual(compiled.longest_match(compiled.encode('abbbc')), (7, 4))
+        self.assertEqual(compiled.longest_match(compiled.encode('cabb'), 1), (7, 4))
+        self.assertEqual(compiled.longest_match(compiled.encode('bab')), (-1, 0))
+        self.assertEqual(compiled.longest_match(compiled.encode('')), (-1, 0))
+
+    def test_stream(self):
+        dfa = parse_regex('(a|b)*abb').thompson().subset_construction()
+        matcher = dfa.stream()
+
+        for chunk in ['ab', '', 'ba', 'a', 'bb']:
+            self.assertTrue(matcher.feed(chunk))
+        self.assertTrue(matcher.finish())
+        self.assertTrue(matcher.feed('a'))
+        self.assertFalse(matcher.finish())
+
+        matcher.reset()
+        self.assertFalse(matcher.feed('abc'))
+        self.assertFalse(matcher.feed('abb'))
+        self.assertFalse(matcher.finish())
+
+    def test_accept_chunks_stops_early(self):
+        compiled = parse_regex('a*b').thompson().subset_construction().compile()
+        fed = []
+        def chunks():
+            for chunk in ['aaa', 'ab', 'aaa', 'b']:
+                fed.append(chunk)
+                yield chunk
+
+        self.assertTrue(compiled.accept_chunks(['aa', 'aa', 'b']))
+        self.assertFalse(compiled.accept_chunks(chunks()))
+        self.assertEqual(fed, ['aaa', 'ab', 'aaa'])
+
+    def test_save_and_load(self):
+        lexer = Lexer([('ID', '([a-z]|[A-Z])+'), ('NUM', '[0-9]+'), ('WS', '(\\ |\n)+')])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lexer.dfa')
+            lexer.matcher.save(path)
+            loaded = CompiledDFA.load(path)
+
+            self.assertIsInstance(loaded.rows[0], memoryview)
+            self.assertEqual(list(loaded.starts), list(lexer.matcher.starts))
+            self.assertEqual(list(loaded.ids), list(lexer.matcher.ids))
+            self.assertEqual(loaded.q0, lexer.matcher.q0)
+            for word in ['abc', 'Ab12', '12 x', '\n\n', '?', '']:
+                self.assertEqual(loaded.accept(word), lexer.matcher.accept(word), word)
+                self.assertEqual(loaded.longest_match(loaded.encode(word)),
+                                 lexer.matcher.longest_match(lexer.matcher.encode(word)), word)
+
+    def test_load_rejects_other_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'not.dfa')
+            with open(path, 'wb') as f:
+                f.write(b'not a dfa at all, just some bytes')
+            self.assertRaises(ValueError, CompiledDFA.load, path)
+
+            dfa = parse_regex('ab*').thompson().subset_construction()
+            dfa.compile().save(path)
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) - 4)
+            self.assertRaises(ValueError, CompiledDFA.load, path)
+
+    def test_lexer_prefix_match(self):
+        # the match is reported by token index, with every construction and engine
+        spec = [('ones', '11+'), ('pair', '01|10'), ('other', '0|1')]
+        for lexer in [Lexer(spec, construction='brzozowski'), Lexer(spec, engine='nfa')]:
+            self.assertEqual(lexer.longest_prefix_match('1110'), (0, 3))
+            self.assertEqual(lexer.longest_prefix_match('012'), (1, 2))
+        lexer = Lexer(spec)
+
+        self.assertEqual(lexer.longest_prefix_match('1110'), (0, 3))
+        self.assertEqual(lexer.longest_prefix_match('102'), (1, 2))
+        self.assertEqual(lexer.longest_prefix_match('2'), (None, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
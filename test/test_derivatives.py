@@ -0,0 +1,91 @@
+import gc
+import itertools
+import unittest
+
+from src.Lexer import Lexer
+from src.Regex import (parse_regex, interned, CharacterRegex, ConcatRegex, KleeneStarRegex,
+                       QuestionRegex, EMPTY, EMPTY_WORD)
+
+
+def collect():
+    # the keys of concatenations refer to their factors, so a factor on a cycle of derivatives
+    # is only found unreachable once the key of a freed concatenation has been dropped
+    while gc.collect():
+        pass
+
+
+class DerivativeTests(unittest.TestCase):
+    def test_hash_consing(self):
+        canonical = lambda regex: parse_regex(regex).canonical()
+
+        self.assertIs(canonical('a|b'), canonical('b|a'))
+        self.assertIs(canonical('(a|b)|c'), canonical('a|(c|b)'))
+        self.assertIs(canonical('a|a'), canonical('a'))
+        self.assertIs(canonical('(ab)c'), canonical('a(bc)'))
+        self.assertIs(canonical('eps a eps'), canonical('a'))
+        self.assertIs(canonical('(a*)*'), canonical('a*'))
+        self.assertIs(canonical('a+'), canonical('aa*'))
+
+    def test_unused_regexes_are_freed(self):
+        # the hash-consing table does not keep regexes, or their derivatives, alive
+        collect()
+        before = len(interned)
+        regex = parse_regex('|'.join(f'key{i}word' for i in range(500)) + '|[a-z0-9]+')
+        self.assertEqual(len(regex.brzozowski().K), 12)
+        self.assertGreater(len(interned), before + 500)
+
+        del regex
+        collect()
+        self.assertEqual(len(interned), before)
+        lexer = Lexer([(f'K{i}', f'key{i}word') for i in range(500)] + [('ID', '[a-z0-9]+')],
+                      construction='brzozowski')
+        collect()
+        self.assertEqual(len(interned), before)
+        self.assertEqual(lexer.lex('key7word'), [('K7', 'key7word')])
+
+    def test_derivative(self):
+        regex = parse_regex('(a|b)*abb')
+
+        self.assertIs(parse_regex('ab').derivative('a'), parse_regex('b').canonical())
+        self.assertIs(parse_regex('ab').derivative('b'), EMPTY)
+        self.assertIs(parse_regex('a').derivative('a'), EMPTY_WORD)
+        self.assertIs(regex.derivative('b'), regex.canonical())
+        self.assertTrue(regex.derivative('a').derivative('b').derivative('b').nullable())
+
+    def test_deep_regexes(self):
+        # derivatives and normal forms are computed without recursion
+        deep = '(x' * 3000 + ')?' * 3000
+        lexer = Lexer([('DEEP', deep)], construction='brzozowski')
+
+        self.assertEqual(lexer.longest_prefix_match('x' * 3001), (0, 3000))
+        self.assertIs(parse_regex(deep).derivative('x').derivative('x'),
+                      parse_regex('(x' * 2998 + ')?' * 2998).canonical())
+        regex = CharacterRegex('a')
+        for _ in range(5000):
+            regex = KleeneStarRegex(ConcatRegex((regex, QuestionRegex(CharacterRegex('b')))))
+        self.assertTrue(regex.canonical().derivative('a').nullable())
+        self.assertIs(regex.canonical().derivative('c'), EMPTY)
+
+    def test_matches_subset_construction(self):
+        for regex in ['a', 'eps', 'ab*c', '(a|b)*abb', 'eps|x(yz)+', '(a*|b?)+c',
+                      '[a-z][0-9]*|[A-Z]?', '((a|b)*)*', '(a|b)*a(a|b)(a|b)']:
+            thompson = parse_regex(regex).thompson().subset_construction()
+            brzozowski = parse_regex(regex).brzozowski()
+            self.assertLessEqual(len(brzozowski.K), len(thompson.K), regex)
+            for length in range(5):
+                for word in map(''.join, itertools.product('abcxy0A', repeat=length)):
+                    self.assertEqual(brzozowski.accept(word), thompson.accept(word),
+                                     f'{regex} on "{word}"')
+
+    def test_lexer(self):
+        spec = [('ABC', 'a(b+)c'), ('AS', 'a+'), ('BCS', '(bc)+'), ('DORC', '(d|c)+'), ('WS', '\\ ')]
+        thompson, brzozowski = Lexer(spec), Lexer(spec, construction='brzozowski')
+
+        for word in ['abbbc aa bcbc dcd', 'abc abca', 'ab', 'x']:
+            self.assertEqual(brzozowski.lex(word), thompson.lex(word), word)
+        with self.assertRaises(ValueError):
+            Lexer(spec, engine='nfa', construction='brzozowski')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from src.CompiledDFA import CompiledDFA
+from src.Determinize import determinize
+from src.LazyDFA import LazyDFA
+from src.NFA import BitParallelNFA, BudgetExceeded
+from src.Regex import parse_regex
+
+
+BLOWUP = '(a|b)*a' + '(a|b)' * 20
+
+
+class DeterminizeTests(unittest.TestCase):
+    def test_within_budget(self):
+        nfa = parse_regex('(a|b)*abb').thompson()
+        result = determinize(nfa, {q: 7 for q in nfa.F}, max_states=100, max_seconds=10)
+
+        self.assertIsNone(result.exceeded)
+        self.assertIsInstance(result.matcher, CompiledDFA)
+        self.assertEqual(result.states, len(result.dfa.K))
+        self.assertEqual(result.matcher.longest_match(result.matcher.encode('babbx')), (7, 4))
+
+    def test_state_budget(self):
+        nfa = parse_regex(BLOWUP).thompson()
+        with self.assertRaises(BudgetExceeded) as raised:
+            nfa.subset_construction(max_states=500)
+        self.assertEqual((raised.exception.budget, raised.exception.states), ('states', 500))
+
+        result = determinize(nfa, max_states=500)
+        self.assertEqual((result.exceeded, result.states), ('states', 500))
+        self.assertIsNone(result.dfa)
+        self.assertIsInstance(result.matcher, LazyDFA)
+        self.assertEqual(result.matcher.cache_size, 500)
+        self.assertTrue(result.matcher.accept('b' * 30 + 'a' + 'b' * 20))
+        self.assertFalse(result.matcher.accept('b' * 30 + 'a' + 'b' * 19))
+
+    def test_time_budget(self):
+        nfa = parse_regex(BLOWUP).thompson()
+        result = determinize(nfa, max_seconds=0.01, fallback='nfa')
+
+        self.assertEqual(result.exceeded, 'time')
+        self.assertGreaterEqual(result.seconds, 0.01)
+        self.assertIsInstance(result.matcher, BitParallelNFA)
+        self.assertEqual(result.matcher.longest_match('a' * 25 + 'c'), (0, 25))
+
+    def test_unknown_fallback(self):
+        with self.assertRaises(ValueError):
+            determinize(parse_regex('a').thompson(), fallback='backtracking')  # type: ignore
+
+
+if __name__ == '__main__':
+    unittest.main()
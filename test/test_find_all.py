@@ -0,0 +1,85 @@
+import random
+import unittest
+from unittest import mock
+
+from src.DFA import DFA
+from src.Regex import parse_regex
+
+
+def leftmost_longest(dfa: DFA, text: str) -> list[tuple[int, int]]:
+    # the reference: try every start from left to right and keep the longest end
+    matches = []
+    pos = 0
+    while pos <= len(text):
+        for start in range(pos, len(text) + 1):
+            ends = [end for end in range(start, len(text) + 1) if dfa.accept(text[start:end])]
+            if ends:
+                matches.append((start, max(ends)))
+                break
+        else:
+            break
+        start, end = matches[-1]
+        pos = end if end > start else start + 1
+    return matches
+
+
+class FindAllTests(unittest.TestCase):
+    def test_against_reference(self):
+        rng = random.Random(1)
+        for regex in ['ab*', 'a*', 'abcd|c', '(a|b)*abb', 'x(yz)+|y', 'eps|ab']:
+            dfa = parse_regex(regex).thompson().subset_construction()
+            for _ in range(200):
+                text = ''.join(rng.choice('abcdxyz?') for _ in range(rng.randint(0, 12)))
+                self.assertEqual(list(dfa.find_all(text)), leftmost_longest(dfa, text),
+                                 f'{regex} in "{text}"')
+
+    def test_leftmost_beats_earliest_end(self):
+        nfa = parse_regex('abcd|c').thompson()
+
+        self.assertEqual(list(nfa.find_all('xabcdxc')), [(1, 5), (6, 7)])
+
+    def test_characters_outside_the_alphabet(self):
+        nfa = parse_regex('[0-9]+').thompson()
+
+        self.assertEqual(list(nfa.find_all('id 42, ünïcode 7!')), [(3, 5), (15, 16)])
+        self.assertEqual(list(nfa.find_all('')), [])
+
+    def test_linear_time(self):
+        # every scan stops right after its match, even when a longer one looks possible at first:
+        # the backward pass takes one step per character, and every scan of the forward pass two
+        # (one to match 'a', one to find that no b follows), counted on the rows of the dfas
+        steps = 0
+
+        class CountingRows(list):
+            def __getitem__(self, i):
+                nonlocal steps
+                steps += isinstance(i, int)
+                return super().__getitem__(i)
+
+        compile = DFA.compile
+
+        def counting_compile(dfa: DFA, *args):
+            compiled = compile(dfa, *args)
+            compiled.rows = CountingRows(compiled.rows)
+            return compiled
+
+        dfa = parse_regex('a|a*b').thompson().subset_construction()
+        self.assertEqual(list(dfa.find_all('aaab')), [(0, 4)])
+        with mock.patch.object(DFA, 'compile', counting_compile):
+            for n in [1000, 10000, 40000]:
+                steps = 0
+                matches = list(dfa.find_all('a' * n))
+
+                self.assertEqual(matches, [(i, i + 1) for i in range(n)])
+                self.assertLessEqual(steps, 3 * n + 1)
+
+    def test_generator(self):
+        dfa = parse_regex('ab').thompson().subset_construction()
+        matches = dfa.find_all('ab' * 1000)
+
+        self.assertEqual(next(matches), (0, 2))
+        self.assertEqual(next(matches), (2, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
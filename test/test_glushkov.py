@@ -0,0 +1,50 @@
+import itertools
+import unittest
+
+from src.Lexer import Lexer
+from src.Regex import parse_regex
+
+
+class GlushkovTests(unittest.TestCase):
+    def test_matches_thompson(self):
+        for regex in ['a', 'eps', 'ab*c', '(a|b)*abb', 'eps|x(yz)+', 'a**', '(a*|b?)+c',
+                      '[a-z][0-9]*|[A-Z]?', '((a|b)*)*']:
+            thompson = parse_regex(regex).thompson().subset_construction()
+            glushkov = parse_regex(regex).glushkov().subset_construction()
+            for length in range(5):
+                for word in map(''.join, itertools.product('abcxyz0A', repeat=length)):
+                    self.assertEqual(glushkov.accept(word), thompson.accept(word),
+                                     f'{regex} on "{word}"')
+
+    def test_one_state_per_position(self):
+        # the parser merges a|b into one character set, which is a single position
+        for regex, positions in [('eps', 0), ('(a|b)*abb', 4), ('(ab)+c?', 3), ('[a-z]([0-9])*', 2)]:
+            nfa = parse_regex(regex).glushkov(4)
+
+            self.assertEqual(nfa.K, set(range(4, 5 + positions)), regex)
+            self.assertEqual(nfa.q0, 4)
+            self.assertTrue(all(c != '' for _, c in nfa.d), regex)
+
+        self.assertEqual(parse_regex('a*b?').glushkov().F, {0, 1, 2})
+
+    def test_deep_regexes(self):
+        # positions are computed without recursion, like the thompson construction
+        deep = '(' * 1200 + 'a' + ''.join(f'{chr(98 + i % 3)})*' for i in range(1200))
+        lexer = Lexer([('DEEP', deep)], construction='glushkov')
+
+        self.assertEqual(len(parse_regex(deep).glushkov().K), 1202)
+        for word, length in [('abcdbcdb', 0), ('cdbcd', 5), ('abcabcdb', 0), ('dd', 2)]:
+            self.assertEqual(lexer.longest_prefix_match(word), (0, length), word)
+
+    def test_lexer(self):
+        spec = [('ABC', 'a(b+)c'), ('AS', 'a+'), ('BCS', '(bc)+'), ('DORC', '(d|c)+'), ('WS', '\\ ')]
+        thompson, glushkov = Lexer(spec), Lexer(spec, construction='glushkov')
+
+        for word in ['abbbc aa bcbc dcd', 'abc abca', 'ab', 'x']:
+            self.assertEqual(glushkov.lex(word), thompson.lex(word), word)
+        with self.assertRaises(ValueError):
+            Lexer(spec, construction='antimirov')  # type: ignore
+
+
+if __name__ == '__main__':
+    unittest.main()
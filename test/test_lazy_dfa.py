@@ -0,0 +1,64 @@
+import itertools
+import random
+import unittest
+
+from src.LazyDFA import LazyDFA
+from src.Regex import parse_regex
+
+
+class LazyDFATests(unittest.TestCase):
+    def check_against_dfa(self, regex: str, alphabet: str, cache_size: int) -> LazyDFA:
+        nfa = parse_regex(regex).thompson()
+        compiled = nfa.subset_construction().compile()
+        lazy = LazyDFA(nfa, cache_size=cache_size, min_chars_per_state=2)
+
+        for length in range(6):
+            for word in map(''.join, itertools.product(alphabet, repeat=length)):
+                self.assertEqual(lazy.accept(word), compiled.accept(word), f'{regex} on "{word}"')
+                self.assertEqual(lazy.longest_match(word),
+                                 compiled.longest_match(compiled.encode(word)), f'"{word}"')
+        return lazy
+
+    def test_matches_subset_construction(self):
+        for regex in ['ab*c', '(a|b)*abb', 'eps|x(yz)+', '11*(00)*101(0|1)(0|1)*']:
+            lazy = self.check_against_dfa(regex, 'abc01xyz'[:5], 4096)
+            self.assertEqual(lazy.evictions, 0)
+
+    def test_only_reached_states_are_built(self):
+        regex = '(a|b)*a(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)'
+        lazy = LazyDFA(parse_regex(regex).thompson())
+
+        self.assertTrue(lazy.accept('b' * 100 + 'a' + 'b' * 8))
+        self.assertFalse(lazy.accept('b' * 100))
+        # the full dfa has over 500 states
+        self.assertLessEqual(lazy.built, 12)
+
+    def test_bounded_cache(self):
+        regex = '(a|b)*a(a|b)(a|b)(a|b)(a|b)(a|b)'
+        lazy = self.check_against_dfa(regex, 'ab', 8)
+        self.assertGreater(lazy.evictions, 0)
+        self.assertLessEqual(len(lazy.cache), 8)
+
+    def test_thrashing_falls_back_to_simulation(self):
+        regex = '(a|b)*a(a|b)(a|b)(a|b)(a|b)(a|b)'
+        nfa = parse_regex(regex).thompson()
+        compiled = nfa.subset_construction().compile()
+        lazy = LazyDFA(nfa, cache_size=2)
+
+        word = ''.join(random.Random(0).choice('ab') for _ in range(5000))
+        self.assertEqual(lazy.longest_match(word), compiled.longest_match(compiled.encode(word)))
+        # the scan stopped caching long before building a state per character
+        self.assertLess(lazy.built, 200)
+        self.check_against_dfa(regex, 'ab', 2)
+
+    def test_tags(self):
+        nfa = parse_regex('a|b').thompson()
+        finals = {q: 3 for q in nfa.F}
+        lazy = LazyDFA(nfa, finals)
+
+        self.assertEqual(lazy.longest_match(lazy.encode('bc')), (3, 1))
+        self.assertEqual(lazy.longest_match(lazy.encode('c')), (-1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import itertools
+import unittest
+
+from src.DFA import DFA
+from src.Lexer import Lexer
+from src.Regex import CharacterRegex, UnionRegex, parse_regex
+
+
+class MinimizeTests(unittest.TestCase):
+    def check_equivalent(self, dfa: DFA, minimal: DFA, alphabet: str, max_length: int) -> None:
+        for length in range(max_length + 1):
+            for word in map(''.join, itertools.product(alphabet, repeat=length)):
+                self.assertEqual(minimal.accept(word), dfa.accept(word), f'differ on "{word}"')
+
+    def test_minimal_sizes(self):
+        # sizes include the sink state that subset construction makes explicit
+        tests = [
+            ('a*', 1),
+            ('ab|ac', 4),
+            ('(a|b)*abb', 4),
+            ('(a|b)*a(a|b)(a|b)(a|b)', 16),
+            ('(aa|a)(aa|a)*', 2),
+        ]
+
+        for regex, size in tests:
+            dfa = parse_regex(regex).thompson().subset_construction()
+            minimal = dfa.minimize()
+            self.assertEqual(len(minimal.K), size, regex)
+            self.assertEqual(minimal.q0, 0)
+            self.check_equivalent(dfa, minimal, 'abc', 6)
+
+    def test_partial_dfa(self):
+        dfa = DFA({'a', 'b'}, {0, 1, 2, 3}, 0,
+                  {(0, 'a'): 1, (1, 'b'): 2, (0, 'b'): 3, (3, 'b'): 2},
+                  {2})
+        minimal = dfa.minimize()
+
+        self.assertEqual(len(minimal.K), 3)
+        self.check_equivalent(dfa, minimal, 'ab', 5)
+
+    def test_key_separates_final_states(self):
+        # built by hand, since the parser would merge a|b into a single character set
+        dfa = UnionRegex((CharacterRegex('a'), CharacterRegex('b'))).thompson().subset_construction()
+
+        self.assertEqual(len(dfa.minimize().K), 3)
+        self.assertEqual(len(dfa.minimize(lambda group: min(group)).K), 4)
+
+    def test_minimized_lexer(self):
+        spec = [('ones', '11+'), ('pair', '01|10'), ('other', '0|1')]
+        lexer = Lexer(spec, minimize=True)
+
+        self.assertEqual(lexer.lex('1011011'),
+                         [('pair', '10'), ('ones', '11'), ('pair', '01'), ('other', '1')])
+        self.assertEqual(lexer.lex('1001'), Lexer(spec).lex('1001'))
+        self.assertLessEqual(len(lexer.dfa.K), len(Lexer(spec).dfa.K))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import itertools
+import unittest
+
+from src.Lexer import Lexer
+from src.NFA import NFA, BitParallelNFA, bit_indices
+from src.Regex import parse_regex
+
+
+class EpsilonClosureTests(unittest.TestCase):
+    def test_matches_definition(self):
+        nfa = NFA(
+            {'a', 'b'},
+            {0, 1, 2, 3, 4, 5, 6, 7},
+            0,
+            {
+                (0, ''): {1, 2},
+                (1, ''): {0},
+                (2, ''): {4, 6},
+                (3, ''): {1},
+                (4, 'a'): {5},
+                (5, ''): {3},
+                (6, 'b'): {7},
+                (7, ''): {3}
+            },
+            {1},
+        )
+        closures = nfa.epsilon_closures()
+
+        self.assertEqual(closures[0], {0, 1, 2, 4, 6})
+        self.assertEqual(closures[5], {5, 3, 1, 0, 2, 4, 6})
+        self.assertEqual(closures[7], {7, 3, 1, 0, 2, 4, 6})
+        self.assertEqual(closures[4], {4})
+        # 0 and 1 form a cycle, so they share their closure
+        self.assertIs(closures[0], closures[1])
+
+    def test_long_chains(self):
+        n = 20000
+        chain = {(i, ''): {i + 1} for i in range(n)}
+        nfa = NFA({'a'}, set(range(n + 1)), 0, chain | {(n, ''): {0}, (n, 'a'): {n}}, {n})
+
+        self.assertEqual(len(nfa.epsilon_closure(n // 2)), n + 1)
+        self.assertTrue(nfa.subset_construction().accept('aaa'))
+
+    def test_roots(self):
+        nfa = NFA({'a'}, {0, 1, 2, 3}, 0, {(0, ''): {1}, (1, 'a'): {2}, (2, ''): {3}}, {3})
+
+        self.assertEqual(nfa.epsilon_closures([2]), {2: {2, 3}, 3: {3}})
+        self.assertEqual(nfa.reachable_states(), {0, 1, 2, 3})
+
+
+class SubsetConstructionTests(unittest.TestCase):
+    def test_bit_indices(self):
+        self.assertEqual(bit_indices(0), [])
+        self.assertEqual(bit_indices(0b101001), [0, 3, 5])
+        self.assertEqual(bit_indices(1 << 5000 | 2), [1, 5000])
+
+    def test_unreachable_states_are_ignored(self):
+        nfa = NFA({'a', 'b'}, {0, 1, 2, 3}, 0,
+                  {(0, 'a'): {1}, (1, ''): {0}, (2, 'b'): {3}, (3, ''): {0}}, {1, 3})
+        dfa = nfa.subset_construction()
+
+        self.assertEqual(dfa.K, {frozenset({0}), frozenset({0, 1}), frozenset()})
+        self.assertEqual(dfa.F, {frozenset({0, 1})})
+        self.assertEqual(dfa.d[(frozenset({0}), 'b')], frozenset())
+        self.assertEqual(dfa.d[(frozenset(), 'a')], frozenset())
+
+    def test_parallel(self):
+        nfa = parse_regex('(a|b)*a(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)').thompson()
+        sequential = nfa.subset_construction(complete=False)
+        parallel = nfa.subset_construction(complete=False, workers=2)
+
+        self.assertEqual(len(sequential.K), 257)
+        self.assertEqual(parallel, sequential)
+
+    def test_partial(self):
+        nfa = NFA({'a', 'b', 'c'}, {0, 1, 2}, 0, {(0, 'a'): {1}, (1, 'b'): {2}, (2, ''): {0}}, {2})
+        complete, partial = nfa.subset_construction(), nfa.subset_construction(complete=False)
+
+        self.assertIn(frozenset(), complete.K)
+        self.assertNotIn(frozenset(), partial.K)
+        self.assertEqual(set(partial.d), {(frozenset({0}), 'a'), (frozenset({1}), 'b'),
+                                          (frozenset({0, 2}), 'a')})
+        for word in ['', 'ab', 'abab', 'abc', 'ba', 'aba']:
+            self.assertEqual(partial.accept(word), complete.accept(word), word)
+        self.assertEqual(partial.compile().rows, complete.compile().rows)
+
+
+class RemoveEpsilonsTests(unittest.TestCase):
+    def test_equivalent_and_smaller(self):
+        for regex in ['a*', '(a|b)*abb', 'ab*c', 'eps|x(yz)+', '11*(00)*101(0|1)(0|1)*']:
+            nfa = parse_regex(regex).thompson()
+            reduced = nfa.remove_epsilons()
+
+            self.assertTrue(all(c != '' for _, c in reduced.d), regex)
+            self.assertLess(len(reduced.K), len(nfa.K), regex)
+            self.assertEqual(reduced.q0, nfa.q0)
+            dfa, reduced_dfa = nfa.subset_construction(), reduced.subset_construction()
+            for length in range(5):
+                for word in map(''.join, itertools.product('abc01xyz', repeat=length)):
+                    self.assertEqual(reduced_dfa.accept(word), dfa.accept(word), f'{regex} on "{word}"')
+
+    def test_merges_identical_futures(self):
+        # both branches end in the same tail, which collapses into one chain
+        reduced = parse_regex('(ab|cb)c').thompson().remove_epsilons()
+
+        self.assertEqual(len(reduced.K), 4)
+        self.assertEqual(len(parse_regex('a*').thompson().remove_epsilons().K), 1)
+
+
+class BitParallelNFATests(unittest.TestCase):
+    def test_matches_subset_construction(self):
+        for regex in ['ab*c', '(a|b)*abb', 'eps|x(yz)+', '11*(00)*101(0|1)(0|1)*', 'a*']:
+            nfa = parse_regex(regex).thompson()
+            compiled = nfa.subset_construction().compile()
+            simulator = BitParallelNFA(nfa)
+            for length in range(6):
+                for word in map(''.join, itertools.product('abc01', repeat=length)):
+                    self.assertEqual(simulator.accept(word), compiled.accept(word), f'{regex} on "{word}"')
+                    for pos in range(len(word) + 1):
+                        self.assertEqual(simulator.longest_match(word, pos),
+                                         compiled.longest_match(compiled.encode(word), pos),
+                                         f'{regex} on "{word}" from {pos}')
+
+    def test_positions_entered_on_different_symbols(self):
+        # 1 is entered on a from 0 and on b from 2, so it is split into two positions, only one
+        # of which may go on to read c
+        nfa = NFA({'a', 'b', 'c'}, {0, 1, 2, 3}, 0,
+                  {(0, 'a'): {1}, (0, 'b'): {2}, (2, 'b'): {1}, (1, 'c'): {3}, (1, ''): {0}},
+                  {1, 3})
+        compiled = nfa.subset_construction().compile()
+        simulator = BitParallelNFA(nfa)
+        for length in range(7):
+            for word in map(''.join, itertools.product('abc', repeat=length)):
+                self.assertEqual(simulator.longest_match(word),
+                                 compiled.longest_match(compiled.encode(word)), word)
+
+    def test_large_nfa(self):
+        # more than a byte of positions, so follow sets span several tables
+        nfa = parse_regex('(a|b)*a(a|b){5}(c|ab|b(ab)*c)*').thompson()
+        compiled = nfa.subset_construction().compile()
+        simulator = BitParallelNFA(nfa)
+        for seed in range(200):
+            word = ''.join('abc'[(seed * 7 + i * i * seed) % 5 % 3] for i in range(40))
+            for pos in (0, 5):
+                self.assertEqual(simulator.longest_match(word, pos),
+                                 compiled.longest_match(compiled.encode(word), pos), word)
+
+    def test_match(self):
+        nfa = parse_regex('(a|b)*a' + '(a|b)' * 20).thompson()
+        word = 'b' * 50 + 'a' + 'b' * 20 + 'c'
+
+        self.assertTrue(nfa.accept(word[:-1]))
+        self.assertFalse(nfa.accept(word[:-2]))
+        self.assertEqual(nfa.match(word), len(word) - 1)
+        self.assertEqual(nfa.match(word, 60), None)
+        # the simulator is built once, so matching in a scan loop does not rebuild its tables
+        self.assertIs(nfa.simulate(), nfa.simulate())
+        self.assertEqual([nfa.match(word, pos) for pos in range(49, 53)], [71, 71, None, None])
+
+    def test_tags_and_lexer(self):
+        nfa = parse_regex('a|ab').thompson()
+        simulator = BitParallelNFA(nfa, {q: 5 for q in nfa.F})
+        self.assertEqual(simulator.longest_match('abx'), (5, 2))
+
+        spec = [('IF', 'if'), ('ID', '([a-z])+'), ('NUM', '[0-9]+'), ('WS', '\\ +')]
+        dfa_lexer, nfa_lexer = Lexer(spec), Lexer(spec, engine='nfa')
+        for word in ['if iff 12 x', 'if 1a', 'ab ?', '']:
+            self.assertEqual(nfa_lexer.lex(word), dfa_lexer.lex(word), word)
+        self.assertIsNone(nfa_lexer.dfa)
+        with self.assertRaises(ValueError):
+            Lexer(spec, minimize=True, engine='nfa')
+
+
+if __name__ == '__main__':
+    unittest.main()
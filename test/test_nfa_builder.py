@@ -0,0 +1,31 @@
+import unittest
+
+from src.NFABuilder import NFABuilder
+from src.NFA import NFA
+from src.Regex import parse_regex
+
+
+class NFABuilderTests(unittest.TestCase):
+    def test_to_nfa(self):
+        builder = NFABuilder(3)
+        q0, q1, q2 = builder.add_state(), builder.add_state(), builder.add_state()
+        builder.add_edge(q1, 'b', q2)
+        builder.add_epsilons(q0, [q1, q2])
+        builder.add_edge(q0, 'a', q0)
+        builder.add_edge(q1, 'b', q0)
+
+        self.assertEqual(builder.to_nfa(q0, [q2]),
+                         NFA({'', 'a', 'b'}, {3, 4, 5}, 3,
+                             {(3, ''): {4, 5}, (3, 'a'): {3}, (4, 'b'): {3, 5}}, {5}))
+
+    def test_thompson_numbering(self):
+        for regex in ['a', 'eps', '(a|b)*abb', 'x(yz)+|y?', '[a-z][0-9]*']:
+            nfa = parse_regex(regex).thompson(7)
+
+            self.assertEqual(nfa.K, set(range(7, 7 + len(nfa.K))), regex)
+            self.assertEqual(nfa.q0, 7)
+            self.assertEqual(nfa.F, {7 + len(nfa.K) - 1}, regex)
+
+
+if __name__ == '__main__':
+    unittest.main()
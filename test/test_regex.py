@@ -0,0 +1,237 @@
+import unittest
+
+from src.Lexer import Lexer
+from src.Regex import EMPTY_WORD, RegexParserError, CharacterRegex, CharacterSetRegex, ConcatRegex, PlusRegex, RepeatRegex, UnionRegex, parse_regex
+
+
+class CanonicalParserTests(unittest.TestCase):
+    def test_simplifications(self):
+        self.assertIs(parse_regex('(a*)*'), parse_regex('a*'))
+        self.assertIs(parse_regex('eps a'), parse_regex('a'))
+        self.assertIs(parse_regex('x|x'), parse_regex('x'))
+        self.assertIs(parse_regex('b|a|eps'), parse_regex('eps|(a|b)'))
+        self.assertIs(parse_regex('(ab)c'), parse_regex('abc'))
+        self.assertEqual(len(parse_regex('((a*)*)*eps').thompson().K), len(parse_regex('a*').thompson().K))
+
+    def test_merged_character_sets(self):
+        regex = parse_regex('a|[0-9]|b|x y')
+
+        self.assertIsInstance(regex, UnionRegex)
+        charsets = [r for r in regex.alternatives if isinstance(r, CharacterSetRegex)]
+        self.assertEqual([r.ranges for r in charsets], [((ord('0'), ord('9')), (ord('a'), ord('b')))])
+        self.assertIs(parse_regex('a|b'), parse_regex('b|a'))
+
+    def test_shared_subtrees(self):
+        regex = parse_regex('[a-z]x|[a-z]y')
+
+        self.assertIsInstance(regex.alternatives[0], ConcatRegex)
+        self.assertIs(regex.alternatives[0].factors[0], regex.alternatives[1].factors[0])
+        self.assertIs(parse_regex('[a-z]'), parse_regex('[a-z]'))
+
+    def test_behaviour_is_unchanged(self):
+        dfa = parse_regex('(a|b|eps)*c?|abc').thompson().subset_construction()
+
+        for word, expected in [('', True), ('abab', True), ('abc', True), ('c', True), ('cc', False)]:
+            self.assertEqual(dfa.accept(word), expected, word)
+
+    def test_plus_is_not_duplicated(self):
+        nested = PlusRegex(PlusRegex(PlusRegex(CharacterRegex('a')))).thompson(3)
+
+        self.assertEqual(len(nested.K), 5)
+        self.assertEqual(nested.F, {7})
+        self.assertIs(parse_regex('[0-9]+'), parse_regex('[0-9][0-9]*'))
+        self.assertIs(parse_regex('x(ab)+'), parse_regex('xab(ab)*'))
+        self.assertIs(parse_regex('(a?)+'), parse_regex('a*'))
+        self.assertLess(len(parse_regex('(ab)+').thompson().K), len(ConcatRegex(
+            (parse_regex('ab'), parse_regex('(ab)*'))).thompson().K))
+
+        dfa = parse_regex('x(yz)+|y?').thompson().subset_construction()
+        for word, expected in [('', True), ('y', True), ('x', False), ('xyz', True), ('xyzyz', True),
+                               ('xyzy', False)]:
+            self.assertEqual(dfa.accept(word), expected, word)
+
+    def test_long_and_deep_regexes(self):
+        # neither the length nor the nesting of a regex is limited by the python stack
+        keywords = parse_regex('|'.join(f'k{i}' for i in range(5000)))
+        literal = parse_regex('ab' * 10000 + '|c')
+
+        self.assertIs(parse_regex('(' * 10000 + 'a' + ')' * 10000), parse_regex('a'))
+        self.assertIs(parse_regex('(' * 10000 + 'a' + ')*' * 10000), parse_regex('a*'))
+        self.assertIs(literal.derivative('c'), EMPTY_WORD)
+        self.assertIs(literal.derivative('a').derivative('b'), parse_regex('ab' * 9999))
+        self.assertIs(keywords, parse_regex('|'.join(f'k{i}' for i in reversed(range(5000)))))
+        self.assertTrue(keywords.derivative('k').derivative('1').derivative('9').nullable())
+
+    def test_nested_groups_scale_linearly(self):
+        # closing a group does not flatten and intern all the groups inside it again
+        self.assertEqual(len(parse_regex('(a' * 20000 + ')' * 20000).factors), 20000)
+        self.assertEqual(len(parse_regex(''.join(f'(k{i}|' for i in range(20000)) + 'b' + ')' * 20000)
+                             .alternatives), 20001)
+        self.assertIs(parse_regex('((a|b)c(d(e|f)))'), parse_regex('(a|b)cd(e|f)'))
+
+    def test_derivatives_share_suffixes(self):
+        # the derivative of a long concatenation is the suffix it already shares its factors
+        # with, so brzozowski's construction does not copy the rest of a literal at every step
+        literal = parse_regex('ab' * 2000)
+        suffix = literal.derivative('a')
+        rest = suffix.derivative('b')
+
+        self.assertIs(suffix.items, literal.items)
+        self.assertIs(rest.items, literal.items)
+        self.assertEqual((suffix.start, rest.start), (1, 2))
+        self.assertIs(rest, parse_regex('ab' * 1999))
+        starred = parse_regex('x*' + 'ab' * 2000)
+        self.assertIs(starred.derivative('x'), starred)
+        self.assertIs(starred.derivative('a'), suffix)
+        self.assertEqual(len(literal.brzozowski().K), 4001)
+
+    def test_flat_thompson_construction(self):
+        # concatenations and unions are flat nodes and the thompson nfa is built without
+        # recursion, so neither long nor deeply nested regexes run into the recursion limit
+        literal = parse_regex('ab' * 2000)
+        nested = parse_regex('(a|' * 1500 + 'b' + ')c' * 1500)
+        keywords = parse_regex('|'.join(f'k{i}' for i in range(3000)))
+
+        self.assertEqual(len(literal.factors), 4000)
+        self.assertEqual(len(literal.thompson().K), 8000)
+        self.assertEqual(len(keywords.alternatives), 3000)
+        self.assertEqual(len(parse_regex('a|bc|de').thompson().K), 12)
+        for regex, word, expected in [(literal, 'ab' * 2000, True), (literal, 'ab' * 1999 + 'a', False),
+                                      (nested, 'ac', True), (nested, 'b' + 'c' * 1500, True),
+                                      (nested, 'bc', False),
+                                      (keywords, 'k2999', True), (keywords, 'k3000', False)]:
+            self.assertEqual(regex.matcher('nfa').accept(word), expected, word[:10])
+
+    def test_epsilon_alternative_anywhere(self):
+        # only canonical unions keep epsilon first, but hand-built ones can have it anywhere
+        for regex in [UnionRegex((CharacterRegex('a'), EMPTY_WORD)),
+                      UnionRegex((EMPTY_WORD, CharacterRegex('a')))]:
+            for word, expected in [('', True), ('a', True), ('aa', False)]:
+                self.assertEqual(regex.thompson().subset_construction().accept(word), expected, regex)
+                self.assertEqual(regex.glushkov().subset_construction().accept(word), expected, regex)
+
+    def test_parser_errors(self):
+        for regex in ['', '(a', 'a|', '(a|(b)', '\\']:
+            with self.assertRaises(RegexParserError):
+                parse_regex(regex)
+        self.assertIs(parse_regex('a**'), parse_regex('a*\\*'))
+        self.assertIs(parse_regex('(|a)'), parse_regex('\\|a'))
+
+
+
+class CharacterClassTests(unittest.TestCase):
+    def test_ranges(self):
+        dfa = parse_regex('[a-fA-F0-9_]+').thompson().subset_construction()
+
+        self.assertEqual(parse_regex('[a-fA-F0-9_]').ranges,
+                         ((ord('0'), ord('9')), (ord('A'), ord('F')), (ord('_'), ord('_')),
+                          (ord('a'), ord('f'))))
+        for word, expected in [('c0FFEE_', True), ('g', False), ('', False), ('a-b', False)]:
+            self.assertEqual(dfa.accept(word), expected, word)
+        self.assertIs(parse_regex('[a-c]'), parse_regex('a|b|c'))
+        self.assertIs(parse_regex('[\\]\\-]'), parse_regex('\\]|-'))
+        self.assertIs(parse_regex('[-a]'), parse_regex('[a-]'))
+        with self.assertRaises(RegexParserError):
+            parse_regex('[z-a]')
+
+    def test_escapes(self):
+        matcher = parse_regex(r'"[^"\n]*"').matcher()
+
+        self.assertIs(parse_regex(r'[^"\n]'), parse_regex('[^"\n]'))
+        self.assertIs(parse_regex(r'[\t\r]'), parse_regex('[\t\r]'))
+        self.assertIs(parse_regex(r'[\\\]\-\^]'), parse_regex('[-\\\\^\\]]'))
+        for word, expected in [('"n"', True), ('"\n"', False), ('"\\n"', True)]:
+            self.assertEqual(matcher.accept(word), expected, word)
+
+    def test_unclosed_bracket_is_a_character(self):
+        self.assertIs(parse_regex('[b'), parse_regex('\\[b'))
+        self.assertIs(parse_regex('[]'), parse_regex('\\[]'))
+
+    def test_negated_class(self):
+        regex = parse_regex('"[^"\n]*"')
+        nfa = regex.thompson()
+
+        # the quote and the three intervals of the class, not a million characters
+        self.assertEqual(len(nfa.S - {''}), 4)
+        for word, expected in [('""', True), ('"héllo 漢字 \U0001F600"', True), ('"a"b"', False),
+                               ('"a\nb"', False), ('"\x00\U0010FFFF"', True)]:
+            self.assertEqual(nfa.subset_construction().accept(word), expected, word)
+            self.assertEqual(nfa.accept(word), expected, word)
+            self.assertEqual(regex.brzozowski().accept(word), expected, word)
+            self.assertEqual(regex.glushkov().subset_construction().accept(word), expected, word)
+        self.assertIs(parse_regex('[^\x00-\U0010FFFF]a'), parse_regex('[^\x00-\U0010FFFF]'))
+
+    def test_lexer(self):
+        spec = [('STRING', '"[^"\n]*"'), ('ID', '[a-zA-Z_][a-zA-Z0-9_]*'), ('WS', '[ \t\n]+'),
+                ('OTHER', '[^a-zA-Z0-9_" \t\n]')]
+        text = 'x = "naïve ✓"\nπ_2 ≥ y'
+        expected = [('ID', 'x'), ('WS', ' '), ('OTHER', '='), ('WS', ' '), ('STRING', '"naïve ✓"'),
+                    ('WS', '\n'), ('OTHER', 'π'), ('ID', '_2'), ('WS', ' '), ('OTHER', '≥'),
+                    ('WS', ' '), ('ID', 'y')]
+
+        for options in [{}, {'minimize': True}, {'engine': 'nfa'}, {'construction': 'glushkov'},
+                        {'construction': 'brzozowski'}]:
+            lexer = Lexer(spec, **options)
+            self.assertEqual(lexer.lex(text), expected, options)
+        # the compiled classes are a few intervals, found by bisection
+        matcher = Lexer(spec).matcher
+        self.assertLess(len(matcher.starts), 20)
+        self.assertEqual(matcher.class_of('\U0001F600'), matcher.class_of('='))
+        self.assertNotEqual(matcher.class_of('"'), matcher.class_of('='))
+
+
+class RepetitionTests(unittest.TestCase):
+    def test_bounds(self):
+        regex = parse_regex('(ab|c){2,4}d')
+        engines = [regex.thompson().subset_construction(), regex.glushkov().subset_construction(),
+                   regex.brzozowski(), regex.matcher('nfa')]
+
+        for word, expected in [('abcd', True), ('ccd', True), ('cd', False), ('abcabcd', True),
+                               ('abcabcabd', False), ('d', False)]:
+            for engine in engines:
+                self.assertEqual(engine.accept(word), expected, (word, engine))
+        for word, expected in [('aa', False), ('aaa', True), ('a' * 50, True)]:
+            self.assertEqual(parse_regex('a{3,}').thompson().accept(word), expected, word)
+        self.assertIs(parse_regex('a{0,}'), parse_regex('a*'))
+        self.assertIs(parse_regex('a{1,}'), parse_regex('a+'))
+        self.assertIs(parse_regex('a{0,1}'), parse_regex('a?'))
+        self.assertIs(parse_regex('a{1}b{0}'), parse_regex('a'))
+        self.assertIs(parse_regex('(a?){2,5}'), parse_regex('(a?){0,5}'))
+
+    def test_malformed_bounds_are_characters(self):
+        for regex in ['a{', 'a{2', 'a{,2}', 'a{x}', 'a{2,x}']:
+            self.assertIs(parse_regex(regex), parse_regex(regex.replace('{', '\\{')), regex)
+        self.assertIs(parse_regex('a*{2}'), parse_regex('a*\\{2}'))
+        with self.assertRaises(RegexParserError):
+            parse_regex('a{3,2}')
+
+    def test_large_bounds(self):
+        # the subtree is shared by every copy: only the automata grow with the bounds
+        regex = parse_regex('[a-z]{3,5000}')
+
+        self.assertIsInstance(regex, RepeatRegex)
+        self.assertIs(regex.r, parse_regex('[a-z]'))
+        self.assertEqual(len(regex.thompson().K), 10001)
+        self.assertEqual(len(regex.glushkov().K), 5001)
+        self.assertEqual(len(regex.brzozowski().K), 5001)
+        matcher = regex.matcher('nfa')
+        for word, expected in [('ab', False), ('abc', True), ('x' * 5000, True), ('x' * 5001, False)]:
+            self.assertEqual(matcher.accept(word), expected, len(word))
+
+    def test_lexer(self):
+        # a second postfix operator is a character, like in a**
+        spec = [('NUMBER', '[0-9]{1,19}'), ('HEX', '0x[0-9a-f]{2}{2}'), ('ID', '[a-z]{3,8}'),
+                ('WS', '\\ +'), ('OTHER', '[^ ]')]
+        text = '12345678901234567890 0xff{2} abcdefghij ab'
+        expected = [('NUMBER', '1234567890123456789'), ('NUMBER', '0'), ('WS', ' '),
+                    ('HEX', '0xff{2}'), ('WS', ' '), ('ID', 'abcdefgh'), ('OTHER', 'i'),
+                    ('OTHER', 'j'), ('WS', ' '), ('OTHER', 'a'), ('OTHER', 'b')]
+
+        for options in [{}, {'minimize': True}, {'engine': 'nfa'}, {'construction': 'glushkov'},
+                        {'construction': 'brzozowski'}]:
+            lexer = Lexer(spec, **options)
+            self.assertEqual(lexer.lex(text), expected, options)
+
+
+if __name__ == '__main__':
+    unittest.main()